@@ -1,13 +1,18 @@
 from django.contrib import admin
+from django.utils.translation import gettext_lazy as _
+
+from airport import distances
 from airport.models import (
     AirplaneType,
     Airplane,
     Crew,
     Airport,
+    Fare,
     Route,
     Flight,
     Order,
     Ticket,
+    SeatMap,
 )
 
 
@@ -103,6 +108,12 @@ class RouteAdmin(admin.ModelAdmin):
         "destination__ICAO_code",
     )
     readonly_fields = ("id",)
+    actions = ("recompute_distance",)
+
+    @admin.action(description=_("Recompute distance of selected routes"))
+    def recompute_distance(self, request, queryset):
+        updated = distances.recompute_routes(route_ids=queryset.values_list("pk", flat=True))
+        self.message_user(request, _("{count} routes updated.").format(count=updated))
 
 
 @admin.register(Flight)
@@ -124,6 +135,18 @@ class FlightAdmin(admin.ModelAdmin):
         "crew__last_name",
     )
     readonly_fields = ("price", "local_arrival_time", "local_departure_time", "id")
+    actions = ("cancel_orders",)
+
+    @admin.action(description=_("Cancel all orders of selected flights"))
+    def cancel_orders(self, request, queryset):
+        cancelled = Order.objects.filter(tickets__flight__in=queryset).cancel()
+        self.message_user(request, _("{count} orders cancelled.").format(count=len(cancelled)))
+
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        return queryset.select_related(
+            "route__source", "route__destination"
+        ).with_price().with_status()
 
 
 @admin.register(Order)
@@ -131,8 +154,13 @@ class OrderAdmin(admin.ModelAdmin):
     list_display = (
         "user",
         "status",
+        "total_price",
         "created_at"
     )
+    list_filter = (
+        "status",
+    )
+    ordering = ("-created_at",)
     search_fields = (
         "user__first_name",
         "user__last_name",
@@ -140,7 +168,19 @@ class OrderAdmin(admin.ModelAdmin):
         "tickets__row",
         "tickets__seat"
     )
-    readonly_fields = ("created_at", "id")
+    readonly_fields = ("created_at", "id", "total_price")
+    actions = ("cancel_orders",)
+
+    @admin.action(description=_("Cancel selected orders"))
+    def cancel_orders(self, request, queryset):
+        cancelled = queryset.cancel()
+        self.message_user(request, _("{count} orders cancelled.").format(count=len(cancelled)))
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        flights = Flight.objects.filter(tickets__order=obj).select_related("airplane")
+        for flight in flights.distinct():
+            SeatMap.objects.rebuild(flight)
 
 
 @admin.register(Ticket)
@@ -156,3 +196,28 @@ class TicketAdmin(admin.ModelAdmin):
         "order__user"
     )
     readonly_fields = ("id", "order")
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        flights = [obj.flight]
+        if change and "flight" in form.changed_data:
+            flights.append(Flight.objects.get(pk=form.initial["flight"]))
+        for flight in flights:
+            SeatMap.objects.rebuild(flight)
+        Fare.objects.invalidate(flights)
+        Order.objects.filter(pk=obj.order_id).recalculate_total_price()
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        SeatMap.objects.rebuild(obj.flight)
+        Fare.objects.invalidate([obj.flight])
+        Order.objects.filter(pk=obj.order_id).recalculate_total_price()
+
+    def delete_queryset(self, request, queryset):
+        flights = list(Flight.objects.filter(tickets__in=queryset).distinct())
+        orders = list(queryset.values_list("order", flat=True).distinct())
+        super().delete_queryset(request, queryset)
+        for flight in flights:
+            SeatMap.objects.rebuild(flight)
+        Fare.objects.invalidate(flights)
+        Order.objects.filter(pk__in=orders).recalculate_total_price()
@@ -0,0 +1,75 @@
+import hashlib
+import time
+
+from django.core.cache import cache
+
+GENERATION_KEY = "airport:responses:generation"
+# Entries are rebuilt after RESPONSE_TTL, and served stale for up to
+# STALE_TTL more while one worker rebuilds them.
+RESPONSE_TTL = 300
+STALE_TTL = 60
+LOCK_TIMEOUT = 10
+WAIT_INTERVAL = 0.05
+
+
+def generation() -> int:
+    """
+    Current version of the cached responses. A missing counter restarts
+    from the clock, so entries written before an eviction stay unreachable.
+    """
+    value = cache.get(GENERATION_KEY)
+    if value is None:
+        cache.add(GENERATION_KEY, time.time_ns(), None)
+        value = cache.get(GENERATION_KEY)
+    return value
+
+
+def invalidate():
+    """Make every cached response unreachable; old entries expire on their own."""
+    try:
+        cache.incr(GENERATION_KEY)
+    except ValueError:
+        cache.add(GENERATION_KEY, time.time_ns(), None)
+
+
+def make_key(*parts) -> str:
+    digest = hashlib.md5(repr(parts).encode(), usedforsecurity=False).hexdigest()
+    return f"airport:responses:{generation()}:{digest}"
+
+
+def get_or_build(key, build):
+    """
+    Cached value for key, calling build() on a miss. build returns
+    (value, cacheable). Only the worker holding the key's lock rebuilds:
+    the others serve the stale value, or wait for the fresh one when
+    there is none, building it themselves if the lock holder gives up.
+    The lock is only as reliable as the backend's add(): Redis and
+    Memcached set it atomically, the file based cache checks then writes,
+    so two workers may occasionally both rebuild.
+    """
+    entry = cache.get(key)
+    if entry is not None and entry[0] > time.time():
+        return entry[1]
+
+    lock_key = f"{key}:lock"
+    if not cache.add(lock_key, 1, LOCK_TIMEOUT):
+        if entry is not None:
+            return entry[1]
+        deadline = time.monotonic() + LOCK_TIMEOUT
+        while time.monotonic() < deadline:
+            time.sleep(WAIT_INTERVAL)
+            entry = cache.get(key)
+            if entry is not None:
+                return entry[1]
+            if cache.add(lock_key, 1, LOCK_TIMEOUT):
+                break
+        else:
+            return build()[0]
+
+    try:
+        value, cacheable = build()
+        if cacheable:
+            cache.set(key, (time.time() + RESPONSE_TTL, value), RESPONSE_TTL + STALE_TTL)
+        return value
+    finally:
+        cache.delete(lock_key)
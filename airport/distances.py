@@ -0,0 +1,116 @@
+import numpy as np
+from django.db import transaction
+from django.db.models import Count, Max, Q
+from django.utils.timezone import now
+
+from airport import caching
+
+EARTH_RADIUS = 6371  # kilometers
+
+
+def haversine(lat1, lon1, lat2, lon2):
+    """
+    Great-circle distance in kilometers using the Haversine formula.
+    Accepts scalars or arrays, which are broadcast against each other.
+    """
+    lat1, lon1, lat2, lon2 = (
+        np.radians(np.asarray(value, dtype=np.float64)) for value in (lat1, lon1, lat2, lon2)
+    )
+    a = (
+        np.sin((lat2 - lat1) / 2) ** 2
+        + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS * np.arcsin(np.sqrt(a))
+
+
+def path_distance(latitudes, longitudes) -> int:
+    """Length of a path through the given points, summed over its legs."""
+    latitudes = np.asarray(latitudes, dtype=np.float64)
+    longitudes = np.asarray(longitudes, dtype=np.float64)
+    legs = haversine(latitudes[:-1], longitudes[:-1], latitudes[1:], longitudes[1:])
+    return round(float(legs.sum()))
+
+
+class DistanceMatrix:
+    """Airport x airport great-circle distances, computed in one vectorized pass."""
+
+    def __init__(self, airports):
+        airports = list(airports)
+        self.index = {pk: position for position, (pk, _, _) in enumerate(airports)}
+        latitudes = np.array([latitude for _, latitude, _ in airports], dtype=np.float64)
+        longitudes = np.array([longitude for _, _, longitude in airports], dtype=np.float64)
+        self.km = haversine(
+            latitudes[:, np.newaxis],
+            longitudes[:, np.newaxis],
+            latitudes[np.newaxis, :],
+            longitudes[np.newaxis, :],
+        )
+
+    def distance(self, source, destination) -> int:
+        return round(float(self.km[self.index[source], self.index[destination]]))
+
+    def path_distance(self, airports) -> int:
+        positions = [self.index[airport] for airport in airports]
+        return round(float(self.km[positions[:-1], positions[1:]].sum()))
+
+
+def airports_version() -> tuple:
+    """
+    Latest updated_at and count of airports, read from the database so a
+    write from any process, or a bulk load that skips signals, changes it.
+    """
+    from airport.models import Airport
+
+    version = Airport.objects.aggregate(updated_at=Max("updated_at"), count=Count("pk"))
+    return version["updated_at"], version["count"]
+
+
+def recompute_routes(airport_ids=None, route_ids=None) -> int:
+    """
+    Rewrite Route.distance through source, stops and destination for the
+    routes using the given airports or with the given ids, or for every route
+    if neither is given. Routes are measured with a matrix of just the
+    airports they use, and changed rows are written in one UPDATE; returns
+    how many were changed.
+    """
+    from airport.models import Airport, Fare, Flight, Route
+
+    routes = Route.objects.only("id", "source_id", "destination_id", "distance")
+    if airport_ids is not None or route_ids is not None:
+        airport_ids, route_ids = list(airport_ids or ()), list(route_ids or ())
+        routes = routes.filter(
+            Q(source__in=airport_ids)
+            | Q(destination__in=airport_ids)
+            | Q(stops__in=airport_ids)
+            | Q(pk__in=route_ids)
+        ).distinct()
+    routes = list(routes)
+    stops = {}
+    through = Route.stops.through.objects.filter(route__in=[route.pk for route in routes])
+    for route_id, airport_id in through.order_by("id").values_list("route_id", "airport_id"):
+        stops.setdefault(route_id, []).append(airport_id)
+
+    paths = {
+        route.pk: [route.source_id, *stops.get(route.pk, ()), route.destination_id]
+        for route in routes
+    }
+    used = {pk for path in paths.values() for pk in path}
+    if not used:
+        return 0
+    distances = DistanceMatrix(
+        Airport.objects.filter(pk__in=used).values_list("pk", "latitude", "longitude")
+    )
+    changed = []
+    updated_at = now()
+    for route in routes:
+        distance = distances.path_distance(paths[route.pk])
+        if distance != route.distance:
+            route.distance, route.updated_at = distance, updated_at
+            changed.append(route)
+    Route.objects.bulk_update(changed, ["distance", "updated_at"])
+    if changed:
+        Fare.objects.invalidate(
+            Flight.objects.filter(route__in=changed).values_list("pk", flat=True)
+        )
+        transaction.on_commit(caching.invalidate)
+    return len(changed)
@@ -0,0 +1,20 @@
+from django.utils.translation import gettext_lazy as _
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+
+class SeatConflict(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = _("Some seats were booked by another order.")
+    default_code = "seat_conflict"
+
+    def __init__(self, seats):
+        """seats: iterable of (flight_id, row, seat) that are already taken."""
+        super().__init__()
+        self.detail = {
+            "detail": self.default_detail,
+            "conflicts": [
+                {"flight": str(flight), "row": row, "seat": seat}
+                for flight, row, seat in sorted(seats, key=lambda key: (str(key[0]), *key[1:]))
+            ],
+        }
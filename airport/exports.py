@@ -0,0 +1,185 @@
+import csv
+from datetime import datetime, time, timedelta
+from itertools import islice
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils.dateparse import parse_date, parse_datetime
+from django.utils.timezone import is_aware, make_aware
+
+CHUNK_SIZE = 2000
+CONTENT_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+
+def parse_bound(value, end=False, tz=None):
+    """
+    A date or datetime range bound, None if value is empty. A bare date
+    means its start, or the start of the next day for an end bound. Naive
+    results are made aware in tz when given. Raises ValueError if invalid.
+    """
+    if not value:
+        return None
+    day = parse_date(value)
+    if day is not None:
+        parsed = datetime.combine(day + timedelta(days=1) if end else day, time.min)
+    else:
+        parsed = parse_datetime(value)
+        if parsed is None:
+            raise ValueError(f"Invalid date: {value}")
+    if tz is not None and not is_aware(parsed):
+        parsed = make_aware(parsed, tz)
+    return parsed
+
+
+class Export:
+    """
+    Columns of one exportable table as (header, lookup) pairs, the time field
+    date ranges apply to and how a status narrows the rows, all done in SQL.
+    """
+
+    def __init__(self, queryset, columns, date_field, filter_status):
+        self.queryset = queryset
+        self.columns = columns
+        self.date_field = date_field
+        self.filter_status = filter_status
+
+    @property
+    def headers(self) -> list:
+        return [header for header, _ in self.columns]
+
+    def rows(self, start=None, end=None, status=None):
+        """
+        Value tuples of the matching rows, by time, read through a
+        server-side cursor CHUNK_SIZE rows at a time.
+        """
+        queryset = self.queryset()
+        if start:
+            queryset = queryset.filter(**{f"{self.date_field}__gte": start})
+        if end:
+            queryset = queryset.filter(**{f"{self.date_field}__lt": end})
+        if status:
+            queryset = self.filter_status(queryset, status.upper())
+        return (
+            queryset.order_by(self.date_field, "pk")
+            .values_list(*[lookup for _, lookup in self.columns])
+            .iterator(chunk_size=CHUNK_SIZE)
+        )
+
+
+def _flights():
+    from airport.models import Flight
+
+    return Flight.objects.all()
+
+
+def _tickets():
+    from airport.models import Ticket
+
+    return Ticket.objects.all()
+
+
+def _orders():
+    from airport.models import Order
+
+    return Order.objects.all()
+
+
+def _transactions():
+    from user.models import Transaction
+
+    return Transaction.objects.all()
+
+
+EXPORTS = {
+    "flights": Export(
+        _flights,
+        (
+            ("id", "pk"),
+            ("source", "route__source__IATA_code"),
+            ("destination", "route__destination__IATA_code"),
+            ("airplane", "airplane__tail_number"),
+            ("departure_time", "departure_time"),
+            ("arrival_time", "arrival_time"),
+        ),
+        "departure_time",
+        lambda queryset, status: queryset.with_flight_status(status),
+    ),
+    "tickets": Export(
+        _tickets,
+        (
+            ("id", "pk"),
+            ("order", "order_id"),
+            ("flight", "flight_id"),
+            ("row", "row"),
+            ("seat", "seat"),
+            ("price", "price"),
+            ("status", "order__status"),
+            ("created_at", "order__created_at"),
+        ),
+        "order__created_at",
+        lambda queryset, status: queryset.filter(order__status=status),
+    ),
+    "orders": Export(
+        _orders,
+        (
+            ("id", "pk"),
+            ("user", "user_id"),
+            ("email", "user__email"),
+            ("status", "status"),
+            ("total_price", "total_price"),
+            ("created_at", "created_at"),
+        ),
+        "created_at",
+        lambda queryset, status: queryset.filter(status=status),
+    ),
+    "transactions": Export(
+        _transactions,
+        (
+            ("id", "pk"),
+            ("user", "user_id"),
+            ("email", "email"),
+            ("amount", "amount"),
+            ("status", "status"),
+            ("date", "date"),
+        ),
+        "date",
+        lambda queryset, status: queryset.filter(status=status),
+    ),
+}
+
+
+def _chunks(rows):
+    while chunk := list(islice(rows, CHUNK_SIZE)):
+        yield chunk
+
+
+def _ndjson(headers, rows):
+    encode = DjangoJSONEncoder().encode
+    for chunk in _chunks(rows):
+        yield "".join(encode(dict(zip(headers, row))) + "\n" for row in chunk)
+
+
+class _Echo:
+    def write(self, value):
+        return value
+
+
+def _csv(headers, rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(headers)
+    for chunk in _chunks(rows):
+        yield "".join(
+            writer.writerow(
+                [value.isoformat() if isinstance(value, datetime) else value for value in row]
+            )
+            for row in chunk
+        )
+
+
+def stream(name, file_format, start=None, end=None, status=None):
+    """Text chunks of the named export in ndjson or csv, one per CHUNK_SIZE rows."""
+    export = EXPORTS[name]
+    render = _csv if file_format == "csv" else _ndjson
+    return render(export.headers, export.rows(start, end, status))
@@ -0,0 +1,12 @@
+from django.contrib.postgres.fields import DateTimeRangeField
+from django.db.models import Func
+
+
+class TsTzRange(Func):
+    """
+    A timestamptz range. Kept out of models.py so migrations can import it
+    without loading the current models.
+    """
+
+    function = "TSTZRANGE"
+    output_field = DateTimeRangeField()
@@ -0,0 +1,34 @@
+from datetime import timedelta
+from decimal import Decimal, ROUND_HALF_UP
+
+BASE_FARE_PER_KM = Decimal("0.025")
+LATE_BOOKING_WINDOW = timedelta(days=3)
+LATE_BOOKING_MARKUP = Decimal("1.2")
+# Occupancy above HIGH_OCCUPANCY_SHARE of the seats adds the markup.
+HIGH_OCCUPANCY_SHARE = (4, 5)
+HIGH_OCCUPANCY_MARKUP = Decimal("1.3")
+CENT = Decimal("0.01")
+
+
+def quote(distance, departure_time, arrival_time, booked_seats, total_seats, at):
+    """
+    Fare of a flight at the given moment, and the moment it expires by time
+    alone: when late booking starts or the flight arrives, None if never.
+    Ticket changes expire it as well, since they can cross the occupancy threshold.
+    """
+    if at > arrival_time:
+        return Decimal("0.00"), None
+    fare = Decimal(distance) * BASE_FARE_PER_KM
+
+    late_booking_from = departure_time - LATE_BOOKING_WINDOW
+    if at > late_booking_from:
+        fare *= LATE_BOOKING_MARKUP
+        valid_until = arrival_time
+    else:
+        valid_until = late_booking_from
+
+    numerator, denominator = HIGH_OCCUPANCY_SHARE
+    if total_seats and booked_seats * denominator > total_seats * numerator:
+        fare *= HIGH_OCCUPANCY_MARKUP
+
+    return fare.quantize(CENT, rounding=ROUND_HALF_UP), valid_until
@@ -0,0 +1,227 @@
+import codecs
+import io
+import json
+import re
+from datetime import date, datetime, time
+from time import perf_counter
+
+from django.core.management.color import no_style
+from django.core.serializers import sort_dependencies
+from django.core.serializers.python import Deserializer
+from django.db import connection, models
+
+from airport.models import Order, Ticket
+
+READ_SIZE = 1 << 16
+BATCH_SIZE = 5000
+# Checked in order: the UTF-32 LE mark starts with the UTF-16 LE one.
+BOMS = (
+    (codecs.BOM_UTF32_LE, "utf-32"),
+    (codecs.BOM_UTF32_BE, "utf-32"),
+    (codecs.BOM_UTF8, "utf-8-sig"),
+    (codecs.BOM_UTF16_LE, "utf-16"),
+    (codecs.BOM_UTF16_BE, "utf-16"),
+)
+WHITESPACE = re.compile(r"\s*")
+
+
+def detect_encoding(head: bytes) -> str:
+    """
+    Encoding of JSON starting with head, from its byte order mark or, without
+    one, from where the zero bytes of the leading ASCII character fall.
+    """
+    for bom, encoding in BOMS:
+        if head.startswith(bom):
+            return encoding
+    if len(head) >= 4:
+        if head[:3] == b"\x00\x00\x00":
+            return "utf-32-be"
+        if head[1:4] == b"\x00\x00\x00":
+            return "utf-32-le"
+    if len(head) >= 2:
+        if head[0] == 0:
+            return "utf-16-be"
+        if head[1] == 0:
+            return "utf-16-le"
+    return "utf-8"
+
+
+def open_fixture(path):
+    """Text stream of the fixture at path in its detected encoding, and the encoding."""
+    with open(path, "rb") as binary:
+        encoding = detect_encoding(binary.read(4))
+    return io.open(path, encoding=encoding), encoding
+
+
+def iter_objects(text):
+    """
+    Objects of a JSON list read from a text stream READ_SIZE characters at
+    a time, so memory holds one chunk rather than the whole fixture.
+    """
+    decoder = json.JSONDecoder()
+    buffer, position, eof = "", 0, False
+
+    def refill():
+        nonlocal buffer, position, eof
+        chunk = text.read(READ_SIZE)
+        eof = not chunk
+        buffer, position = buffer[position:] + chunk, 0
+
+    def peek():
+        nonlocal position
+        while True:
+            position = WHITESPACE.match(buffer, position).end()
+            if position < len(buffer):
+                return buffer[position]
+            if eof:
+                raise ValueError("Unexpected end of fixture.")
+            refill()
+
+    if peek() != "[":
+        raise ValueError("Fixture must be a JSON list.")
+    position += 1
+    if peek() == "]":
+        return
+    while True:
+        peek()
+        try:
+            obj, position = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            refill()
+            continue
+        yield obj
+        separator = peek()
+        position += 1
+        if separator == "]":
+            return
+        if separator != ",":
+            raise ValueError(f"Expected ',' or ']' in fixture, got {separator!r}.")
+
+
+def _copy_text(value) -> str:
+    """A value in COPY text format."""
+    if value is None:
+        return r"\N"
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    if isinstance(value, (bytes, memoryview)):
+        return "\\\\x" + bytes(value).hex()
+    return (
+        str(value)
+        .replace("\\", "\\\\")
+        .replace("\t", "\\t")
+        .replace("\n", "\\n")
+        .replace("\r", "\\r")
+    )
+
+
+def copy_objects(model, objects):
+    """
+    Insert unsaved instances of model with one COPY, skipping save() and
+    signals. Values are written as given; auto_now fields are only filled
+    when empty. Database-generated primary keys are left out when unset.
+    """
+    fields = [
+        field
+        for field in model._meta.concrete_fields
+        if not (field.db_returning and all(getattr(obj, field.attname) is None for obj in objects))
+    ]
+    lines = []
+    for obj in objects:
+        values = []
+        for field in fields:
+            value = getattr(obj, field.attname)
+            automatic = getattr(field, "auto_now", False) or getattr(field, "auto_now_add", False)
+            if value is None and automatic:
+                value = field.pre_save(obj, add=True)
+            if isinstance(field, models.JSONField):
+                value = json.dumps(value, cls=field.encoder)
+            else:
+                value = field.get_db_prep_save(value, connection)
+            values.append(_copy_text(value))
+        lines.append("\t".join(values))
+
+    quote = connection.ops.quote_name
+    sql = (
+        f"COPY {quote(model._meta.db_table)} "
+        f"({', '.join(quote(field.column) for field in fields)}) FROM STDIN"
+    )
+    data = "\n".join(lines) + "\n"
+    with connection.cursor() as cursor:
+        if hasattr(cursor, "copy_expert"):
+            cursor.copy_expert(sql, io.StringIO(data))
+        else:
+            with cursor.copy(sql) as copy:
+                copy.write(data)
+
+
+class BulkLoader:
+    """
+    Collect deserialized objects and many-to-many rows per model and COPY
+    each model's rows batch_size at a time. Run inside a transaction:
+    PostgreSQL checks Django's foreign keys at commit, so models may arrive
+    in any order; whatever is left is written in dependency order by finish().
+    Totals of the orders loaded or given tickets are recalculated there too,
+    since COPY skips the code that keeps them.
+    """
+
+    def __init__(self, batch_size=BATCH_SIZE, progress=None):
+        self.batch_size = batch_size
+        self.progress = progress
+        self.pending = {}
+        self.stats = {}
+        self.orders = set()
+
+    def load(self, objects):
+        for deserialized in Deserializer(objects):
+            self.add(deserialized)
+        self.finish()
+
+    def add(self, deserialized):
+        obj = deserialized.object
+        self.queue(type(obj), obj)
+        for field_name, values in (deserialized.m2m_data or {}).items():
+            field = type(obj)._meta.get_field(field_name)
+            through = field.remote_field.through
+            source = f"{field.m2m_field_name()}_id"
+            target = f"{field.m2m_reverse_field_name()}_id"
+            for value in values:
+                self.queue(through, through(**{source: obj.pk, target: value}))
+
+    def queue(self, model, obj):
+        rows = self.pending.setdefault(model, [])
+        rows.append(obj)
+        if len(rows) >= self.batch_size:
+            self.flush(model)
+
+    def flush(self, model):
+        rows = self.pending.pop(model, [])
+        if not rows:
+            return
+        if model is Order:
+            self.orders.update(obj.pk for obj in rows)
+        elif model is Ticket:
+            self.orders.update(obj.order_id for obj in rows)
+        started = perf_counter()
+        copy_objects(model, rows)
+        stats = self.stats.setdefault(model, [0, 0.0])
+        stats[0] += len(rows)
+        stats[1] += perf_counter() - started
+        if self.progress:
+            self.progress(model, *stats)
+
+    def finish(self):
+        ordered = sort_dependencies([(None, list(self.pending))], allow_cycles=True)
+        for model in ordered + list(self.pending):
+            self.flush(model)
+        with connection.cursor() as cursor:
+            for sql in connection.ops.sequence_reset_sql(no_style(), list(self.stats)):
+                cursor.execute(sql)
+        orders, self.orders = list(self.orders), set()
+        for start in range(0, len(orders), self.batch_size):
+            batch = orders[start:start + self.batch_size]
+            Order.objects.filter(pk__in=batch).recalculate_total_price()
@@ -0,0 +1,135 @@
+import threading
+from bisect import bisect_left, bisect_right
+from collections import namedtuple
+from datetime import timedelta
+from time import monotonic
+
+from django.utils.timezone import now
+
+MIN_CONNECTION_TIME = timedelta(minutes=45)
+MAX_CONNECTION_TIME = timedelta(hours=24)
+# Writes made by other workers only reach this process through a full rebuild.
+GRAPH_TTL = 300
+
+Leg = namedtuple("Leg", ("departure", "arrival", "flight", "source", "destination", "price"))
+
+
+class FlightGraph:
+    """
+    Time-expanded graph of upcoming flights, held in memory per process.
+
+    Every airport keeps its outgoing legs sorted by departure, so each hop
+    of a search is a bisect over a list instead of a query. Times are aware
+    datetimes, so connection windows hold across airport timezones.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._legs = {}
+        self._by_airport = {}
+        self._index = {}
+        self._dirty = set()
+        self._built_at = None
+
+    def invalidate(self, flight_ids=None):
+        """Reload the given flights on the next search, or everything if None."""
+        with self._lock:
+            if flight_ids is None:
+                self._built_at = None
+            else:
+                self._dirty.update(flight_ids)
+
+    @staticmethod
+    def load(**filters) -> list:
+        from airport.models import Fare, Flight
+
+        rows = list(
+            Flight.objects.filter(departure_time__gt=now(), **filters).values_list(
+                "departure_time",
+                "arrival_time",
+                "pk",
+                "route__source_id",
+                "route__destination_id",
+            )
+        )
+        prices = Fare.objects.for_flights(row[2] for row in rows)
+        return [Leg(*row, prices.get(row[2])) for row in rows]
+
+    def refresh(self):
+        if self._built_at is None or monotonic() - self._built_at > GRAPH_TTL:
+            self._legs, self._by_airport, self._index = {}, {}, {}
+            self._dirty.clear()
+            self._add(self.load())
+            self._built_at = monotonic()
+        elif self._dirty:
+            flight_ids, self._dirty = self._dirty, set()
+            touched = set()
+            for flight_id in flight_ids:
+                leg = self._legs.pop(flight_id, None)
+                if leg is not None:
+                    del self._by_airport[leg.source][flight_id]
+                    touched.add(leg.source)
+            touched.update(self._add(self.load(pk__in=flight_ids), reindex=False))
+            for airport in touched:
+                self._reindex(airport)
+
+    def _add(self, legs, reindex=True) -> set:
+        touched = set()
+        for leg in legs:
+            self._legs[leg.flight] = leg
+            self._by_airport.setdefault(leg.source, {})[leg.flight] = leg
+            touched.add(leg.source)
+        if reindex:
+            for airport in touched:
+                self._reindex(airport)
+        return touched
+
+    def _reindex(self, airport):
+        legs = sorted(self._by_airport.get(airport, {}).values(), key=lambda leg: leg.departure)
+        self._index[airport] = ([leg.departure for leg in legs], legs)
+
+    def departing(self, airport, start, end) -> list:
+        times, legs = self._index.get(airport, ((), ()))
+        return legs[bisect_left(times, start):bisect_right(times, end)]
+
+    def search(
+        self, source, destination, start, end, max_connections=1, order_by="duration", limit=10
+    ) -> list:
+        """
+        Itineraries from source to destination leaving within [start, end],
+        with up to max_connections changes, each a tuple of legs.
+        """
+        found = []
+
+        def extend(path, visited):
+            last = path[-1]
+            if last.destination == destination:
+                found.append(tuple(path))
+                return
+            if len(path) > max_connections:
+                return
+            for leg in self.departing(
+                last.destination,
+                last.arrival + MIN_CONNECTION_TIME,
+                last.arrival + MAX_CONNECTION_TIME,
+            ):
+                if leg.destination not in visited:
+                    extend(path + [leg], visited | {leg.destination})
+
+        with self._lock:
+            self.refresh()
+            for leg in self.departing(source, start, end):
+                extend([leg], {source, leg.destination})
+
+        if order_by == "price":
+            found.sort(key=lambda legs: (sum(leg.price for leg in legs), duration(legs)))
+        else:
+            found.sort(key=lambda legs: (duration(legs), len(legs)))
+        return found[:limit]
+
+
+def duration(legs) -> timedelta:
+    return legs[-1].arrival - legs[0].departure
+
+
+graph = FlightGraph()
@@ -0,0 +1,100 @@
+from bisect import bisect_right
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+
+import pytz
+from django.utils.timezone import now
+
+
+@lru_cache(maxsize=None)
+def get_timezone(name: str):
+    """The pytz timezone for name, looked up once per process."""
+    return pytz.timezone(name)
+
+
+def localize(value: datetime, timezone_name: str) -> str:
+    return value.astimezone(get_timezone(timezone_name)).isoformat()
+
+
+@lru_cache(maxsize=None)
+def _fixed_offset(offset: timedelta) -> timezone:
+    return timezone(offset)
+
+
+@lru_cache(maxsize=None)
+def _offset_finder(timezone_name: str):
+    """
+    Function returning the fixed-offset tzinfo in effect at an aware
+    datetime, bisecting the zone's UTC transitions instead of going through
+    pytz's per-call conversion. Zones without transitions have one offset.
+    """
+    tz = get_timezone(timezone_name)
+    transitions = getattr(tz, "_utc_transition_times", None)
+    if not transitions:
+        offset = _fixed_offset(tz.utcoffset(datetime(2000, 1, 1)))
+        return lambda value: offset
+    transitions = [transition.replace(tzinfo=timezone.utc) for transition in transitions]
+    offsets = [_fixed_offset(info[0]) for info in tz._transition_info]
+    return lambda value: offsets[max(bisect_right(transitions, value) - 1, 0)]
+
+
+def localize_many(values) -> list:
+    """
+    ISO local times of (datetime, timezone name) pairs, in order. Values are
+    grouped by timezone, so each zone's offsets are resolved once per batch.
+    """
+    grouped = {}
+    for position, (value, timezone_name) in enumerate(values):
+        grouped.setdefault(timezone_name, []).append((position, value))
+    localized = [None] * len(values)
+    for timezone_name, items in grouped.items():
+        find_offset = _offset_finder(timezone_name)
+        for position, value in items:
+            localized[position] = value.astimezone(find_offset(value)).isoformat()
+    return localized
+
+
+def localize_flights(flights):
+    """
+    Store local departure and arrival times on every flight. Timezones of
+    routes that were not selected with their airports are read in one query.
+    """
+    from airport.models import Flight, Route
+
+    flights = [flight for flight in flights if not hasattr(flight, "localized_departure_time")]
+    route_field = Flight._meta.get_field("route")
+    source_field = Route._meta.get_field("source")
+    destination_field = Route._meta.get_field("destination")
+    timezones, missing = {}, set()
+    for flight in flights:
+        if flight.route_id in timezones or flight.route_id in missing:
+            continue
+        route = flight.route if route_field.is_cached(flight) else None
+        if route and source_field.is_cached(route) and destination_field.is_cached(route):
+            timezones[flight.route_id] = (route.source.timezone, route.destination.timezone)
+        else:
+            missing.add(flight.route_id)
+    if missing:
+        routes = Route.objects.filter(pk__in=missing).values_list(
+            "pk", "source__timezone", "destination__timezone"
+        )
+        timezones.update((pk, (source, destination)) for pk, source, destination in routes)
+
+    pairs = []
+    for flight in flights:
+        source, destination = timezones[flight.route_id]
+        pairs += [(flight.departure_time, source), (flight.arrival_time, destination)]
+    localized = localize_many(pairs)
+    for flight, departure, arrival in zip(flights, localized[::2], localized[1::2]):
+        flight.localized_departure_time = departure
+        flight.localized_arrival_time = arrival
+
+
+def localize_airports(airports):
+    """Store the current local time on every airport, computed once per timezone."""
+    moment = now()
+    current = {}
+    for airport in airports:
+        if airport.timezone not in current:
+            current[airport.timezone] = localize(moment, airport.timezone)
+        airport.localized_current_time = current[airport.timezone]
@@ -0,0 +1,58 @@
+from datetime import timedelta
+from itertools import cycle
+from time import perf_counter
+
+import pytz
+from django.core.management import BaseCommand
+from django.utils.timezone import localtime, now
+
+from airport.localization import localize_flights
+from airport.models import Airport, Flight, Route
+
+
+class Command(BaseCommand):
+    help = "Compare per-row cost of localizing flight times row by row and in batch."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=10000)
+        parser.add_argument("--repeat", type=int, default=5)
+
+    def handle(self, *args, **options):
+        rows, repeat = options["rows"], options["repeat"]
+        timezones = cycle(["Europe/Kyiv", "Europe/Berlin", "America/New_York", "Asia/Tokyo"])
+        airports = [Airport(timezone=next(timezones)) for _ in range(8)]
+        routes = [
+            Route(source=source, destination=destination)
+            for source in airports
+            for destination in airports
+            if source is not destination
+        ]
+        start = now()
+
+        def flights():
+            return [
+                Flight(
+                    route=routes[position % len(routes)],
+                    departure_time=start + timedelta(minutes=position),
+                    arrival_time=start + timedelta(minutes=position + 90),
+                )
+                for position in range(rows)
+            ]
+
+        def row_by_row(page):
+            for flight in page:
+                localtime(
+                    flight.departure_time, timezone=pytz.timezone(flight.route.source.timezone)
+                ).isoformat()
+                localtime(
+                    flight.arrival_time, timezone=pytz.timezone(flight.route.destination.timezone)
+                ).isoformat()
+
+        for name, localize in (("row by row", row_by_row), ("batch", localize_flights)):
+            best = float("inf")
+            for _ in range(repeat):
+                page = flights()
+                started = perf_counter()
+                localize(page)
+                best = min(best, perf_counter() - started)
+            self.stdout.write(f"{name}: {best / rows * 1e6:.2f} us per row ({rows} rows)")
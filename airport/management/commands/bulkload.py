@@ -0,0 +1,50 @@
+from time import perf_counter
+
+from django.core.management import BaseCommand, CommandError
+from django.db import DatabaseError, transaction
+
+from airport import caching, fixtures
+
+
+class Command(BaseCommand):
+    help = (
+        "Load JSON fixtures such as data.yaml with PostgreSQL COPY, without "
+        "running save() or signals. Much faster than loaddata for large dumps."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("fixtures", nargs="+")
+        parser.add_argument("--batch-size", type=int, default=fixtures.BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        self.verbosity = options["verbosity"]
+        loader = fixtures.BulkLoader(max(options["batch_size"], 1), self.report)
+        started = perf_counter()
+        try:
+            with transaction.atomic():
+                for path in options["fixtures"]:
+                    text, encoding = fixtures.open_fixture(path)
+                    self.stdout.write(f"Loading {path} ({encoding})...")
+                    with text:
+                        loader.load(fixtures.iter_objects(text))
+        except (OSError, ValueError, DatabaseError) as e:
+            raise CommandError(f"Loading failed, nothing was saved: {e}")
+        caching.invalidate()
+
+        elapsed = perf_counter() - started
+        total = sum(rows for rows, _ in loader.stats.values())
+        for model, (rows, seconds) in loader.stats.items():
+            self.stdout.write(f"{model._meta.label}: {rows} rows, {self.rate(rows, seconds)}")
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Loaded {total} rows in {elapsed:.2f}s, {self.rate(total, elapsed)}"
+            )
+        )
+
+    def report(self, model, rows, seconds):
+        if self.verbosity:
+            self.stdout.write(f"  {model._meta.label}: {rows} rows, {self.rate(rows, seconds)}")
+
+    @staticmethod
+    def rate(rows, seconds) -> str:
+        return f"{rows / seconds if seconds else 0:.0f} rows/s"
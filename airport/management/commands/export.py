@@ -0,0 +1,39 @@
+from datetime import timezone
+
+from django.core.management import BaseCommand, CommandError
+
+from airport import exports
+
+
+class Command(BaseCommand):
+    help = "Stream flights, tickets, orders or transactions as NDJSON or CSV."
+
+    def add_arguments(self, parser):
+        parser.add_argument("name", choices=list(exports.EXPORTS))
+        parser.add_argument(
+            "--format", dest="file_format", choices=list(exports.CONTENT_TYPES), default="ndjson"
+        )
+        parser.add_argument("--from", dest="start", help="Date or datetime, UTC if naive.")
+        parser.add_argument("--to", dest="end", help="Date (inclusive) or datetime, UTC if naive.")
+        parser.add_argument("--status")
+        parser.add_argument("--output", "-o", help="File to write, stdout by default.")
+
+    def handle(self, *args, **options):
+        start = self.parse(options["start"], "--from")
+        end = self.parse(options["end"], "--to", end=True)
+        chunks = exports.stream(
+            options["name"], options["file_format"], start, end, options["status"]
+        )
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8", newline="") as output:
+                output.writelines(chunks)
+        else:
+            for chunk in chunks:
+                self.stdout.write(chunk, ending="")
+
+    @staticmethod
+    def parse(value, option, end=False):
+        try:
+            return exports.parse_bound(value, end, timezone.utc)
+        except ValueError:
+            raise CommandError(f"{option}: invalid date.")
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.4 on 2026-10-17 06:00
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("airport", "0009_flight_departure_id_idx_and_more"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SeatMap",
+            fields=[
+                (
+                    "id",
+                    models.UUIDField(
+                        default=uuid.uuid4,
+                        editable=False,
+                        primary_key=True,
+                        serialize=False,
+                    ),
+                ),
+                ("rows", models.IntegerField()),
+                ("seats_in_row", models.IntegerField()),
+                ("taken", models.BinaryField(default=b"")),
+                (
+                    "flight",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="seat_map",
+                        to="airport.flight",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Seat Map",
+                "verbose_name_plural": "Seat Maps",
+            },
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 5.2.4 on 2026-10-17 06:06
+
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def fill_total_price(apps, schema_editor):
+    Order = apps.get_model("airport", "Order")
+    Ticket = apps.get_model("airport", "Ticket")
+    ticket_total = (
+        Ticket.objects.filter(order=OuterRef("pk"))
+        .order_by()
+        .values("order")
+        .annotate(total=Sum("price"))
+        .values("total")
+    )
+    Order.objects.update(
+        total_price=Coalesce(
+            Subquery(ticket_total, output_field=models.DecimalField()), Value(Decimal(0))
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("airport", "0010_seatmap"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="order",
+            name="total_price",
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=10),
+        ),
+        migrations.RunPython(fill_total_price, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name="order",
+            index=models.Index(
+                fields=["user", "total_price"], name="order_user_total_price_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="order",
+            index=models.Index(fields=["total_price"], name="order_total_price_idx"),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.4 on 2026-10-17 06:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("airport", "0011_order_total_price"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="flight",
+            index=models.Index(
+                fields=["arrival_time", "departure_time"],
+                name="flight_arrival_departure_idx",
+            ),
+        ),
+    ]
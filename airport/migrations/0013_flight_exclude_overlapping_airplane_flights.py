@@ -0,0 +1,78 @@
+# Generated by Django 5.2.4 on 2026-10-17 06:12
+
+import airport.expressions
+import django.contrib.postgres.constraints
+import django.contrib.postgres.fields.ranges
+from django.contrib.postgres.operations import BtreeGistExtension
+from django.db import migrations
+
+OVERLAP_REPORT_LIMIT = 20
+
+
+def check_overlapping_flights(apps, schema_editor):
+    """Fail with the offending flights rather than an IntegrityError."""
+    table = schema_editor.quote_name(apps.get_model("airport", "Flight")._meta.db_table)
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            SELECT a.airplane_id, a.id, a.departure_time, a.arrival_time,
+                   b.id, b.departure_time, b.arrival_time
+            FROM {table} a
+            JOIN {table} b
+              ON a.airplane_id = b.airplane_id
+             AND a.id < b.id
+             AND TSTZRANGE(a.departure_time, a.arrival_time)
+                 && TSTZRANGE(b.departure_time, b.arrival_time)
+            ORDER BY a.departure_time, a.id, b.id
+            LIMIT %s
+            """,
+            [OVERLAP_REPORT_LIMIT + 1],
+        )
+        overlaps = cursor.fetchall()
+    if not overlaps:
+        return
+    lines = [
+        f"  airplane {airplane}: flight {first} ({first_departure} - {first_arrival})"
+        f" overlaps flight {second} ({second_departure} - {second_arrival})"
+        for (
+            airplane, first, first_departure, first_arrival,
+            second, second_departure, second_arrival,
+        ) in overlaps[:OVERLAP_REPORT_LIMIT]
+    ]
+    if len(overlaps) > OVERLAP_REPORT_LIMIT:
+        lines.append("  ...")
+    raise RuntimeError(
+        "Cannot add exclude_overlapping_airplane_flights: some airplanes are scheduled "
+        "on overlapping flights. Reschedule or reassign them, then migrate again.\n"
+        + "\n".join(lines)
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("airport", "0012_flight_arrival_departure_idx"),
+    ]
+
+    operations = [
+        BtreeGistExtension(),
+        migrations.RunPython(check_overlapping_flights, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="flight",
+            constraint=django.contrib.postgres.constraints.ExclusionConstraint(
+                expressions=[
+                    ("airplane", "="),
+                    (
+                        airport.expressions.TsTzRange(
+                            "departure_time",
+                            "arrival_time",
+                            django.contrib.postgres.fields.ranges.RangeBoundary(),
+                        ),
+                        "&&",
+                    ),
+                ],
+                name="exclude_overlapping_airplane_flights",
+                violation_error_message="Airplane is already scheduled during this flight.",
+            ),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.4 on 2026-10-17 06:28
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("airport", "0013_flight_exclude_overlapping_airplane_flights"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Fare",
+            fields=[
+                (
+                    "id",
+                    models.UUIDField(
+                        default=uuid.uuid4,
+                        editable=False,
+                        primary_key=True,
+                        serialize=False,
+                    ),
+                ),
+                ("amount", models.DecimalField(decimal_places=2, max_digits=10)),
+                ("valid_until", models.DateTimeField(blank=True, null=True)),
+                (
+                    "flight",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="fare",
+                        to="airport.flight",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Fare",
+                "verbose_name_plural": "Fares",
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-17 07:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("airport", "0015_updated_at"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="fare",
+            name="version",
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
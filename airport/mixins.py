@@ -0,0 +1,120 @@
+import hashlib
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe
+from django.utils.translation import get_language
+from rest_framework.response import Response
+
+from airport import caching
+
+
+class ConditionalGetMixin:
+    """
+    Weak ETag and Last-Modified on list and retrieve, built from one
+    max(updated_at)/count query over the rows the request reads. A matching
+    If-None-Match or If-Modified-Since gets 304 before anything is serialized.
+
+    Deletions only change the count, which the ETag carries and
+    Last-Modified cannot, so clients should prefer If-None-Match. Writes
+    that change how a row is rendered must touch its updated_at, e.g.
+    saving an airport touches the routes that use it. Actions whose
+    output changes without a write, such as anything showing an
+    airport's current time, must be left out of conditional_actions, or
+    have what changes folded into version_aggregates().
+    """
+
+    conditional_actions = ("list", "retrieve")
+
+    def version_aggregates(self):
+        return {"last_modified": Max("updated_at"), "count": Count("pk")}
+
+    def list(self, request, *args, **kwargs):
+        if "list" not in self.conditional_actions:
+            return super().list(request, *args, **kwargs)
+        queryset = self.filter_queryset(self.get_queryset())
+        return self.conditional(queryset, super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        if "retrieve" not in self.conditional_actions:
+            return super().retrieve(request, *args, **kwargs)
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        try:
+            queryset = self.filter_queryset(self.get_queryset()).filter(
+                **{self.lookup_field: kwargs[lookup_url_kwarg]}
+            )
+        except (DjangoValidationError, ValueError, TypeError):
+            return super().retrieve(request, *args, **kwargs)
+        return self.conditional(queryset, super().retrieve, request, *args, **kwargs)
+
+    def conditional(self, queryset, handler, request, *args, **kwargs):
+        version = queryset.order_by().aggregate(**self.version_aggregates())
+        last_modified = version["last_modified"]
+        timestamp = int(last_modified.timestamp()) if last_modified else None
+        key = (request.get_full_path(), get_language(), *version.values())
+        etag = f'W/"{hashlib.md5(repr(key).encode(), usedforsecurity=False).hexdigest()}"'
+
+        response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+        if response is None:
+            response = handler(request, *args, **kwargs)
+        if response.status_code in (200, 304):
+            response["ETag"] = etag
+            if timestamp is not None:
+                response["Last-Modified"] = http_date(timestamp)
+        return response
+
+
+class CachedResponseMixin:
+    """
+    Serve list and retrieve from the cache framework, keyed on host, path,
+    query parameters and language, so repeated reads skip the database and
+    the serializer. Entries belong to the current caching generation, which
+    signals bump whenever the cached models change. As with conditional
+    GET, cached_actions must only name actions whose output changes with
+    the stored rows alone.
+    """
+
+    cached_actions = ("list", "retrieve")
+
+    def list(self, request, *args, **kwargs):
+        if "list" not in self.cached_actions:
+            return super().list(request, *args, **kwargs)
+        return self.cached(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        if "retrieve" not in self.cached_actions:
+            return super().retrieve(request, *args, **kwargs)
+        return self.cached(super().retrieve, request, *args, **kwargs)
+
+    def cached(self, handler, request, *args, **kwargs):
+        key = caching.make_key(
+            request.get_host(), request.path, sorted(request.GET.lists()), get_language()
+        )
+
+        def build():
+            response = handler(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response, False
+            headers = {
+                header: response[header]
+                for header in ("ETag", "Last-Modified")
+                if header in response
+            }
+            return (response.data, headers), True
+
+        result = caching.get_or_build(key, build)
+        if isinstance(result, Response):
+            return result
+        data, headers = result
+        last_modified = headers.get("Last-Modified")
+        response = get_conditional_response(
+            request,
+            etag=headers.get("ETag"),
+            last_modified=last_modified and parse_http_date_safe(last_modified),
+        )
+        if response is None:
+            response = Response(data)
+        for header, value in headers.items():
+            response[header] = value
+        return response
@@ -1,14 +1,35 @@
 import os
 import uuid
-from datetime import datetime, timedelta
+from datetime import datetime
 from decimal import Decimal
-from math import radians, cos, sin, asin, sqrt
 import pytz
+from django.contrib.postgres.constraints import ExclusionConstraint
+from django.contrib.postgres.fields import RangeBoundary, RangeOperators
 from django.core.validators import MinValueValidator
-from django.db import models
-from django.utils.timezone import now, localtime
+from django.db import connection, models, transaction
+from django.db.models import (
+    BooleanField,
+    Case,
+    Count,
+    DecimalField,
+    Exists,
+    ExpressionWrapper,
+    IntegerField,
+    OuterRef,
+    Q,
+    Subquery,
+    Sum,
+    Value,
+    When,
+)
+from django.db.models.functions import Coalesce, Now
+from django.utils.timezone import now
 from django.utils.translation import gettext_lazy as _
 
+from airport import distances, fares
+from airport.expressions import TsTzRange
+from airport.localization import get_timezone, localize
+
 
 class BaseModel(models.Model):
     """Base model for all models."""
@@ -20,6 +41,7 @@ class BaseModel(models.Model):
 
 class AirplaneType(BaseModel):
     name = models.CharField(max_length=255)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     class Meta:
         verbose_name_plural = _("Airplane Types")
@@ -72,6 +94,7 @@ class Airplane(BaseModel):
         ]
     )
     image = models.ImageField(upload_to=airplane_image, null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     class Meta:
         verbose_name_plural = _("Airplanes")
@@ -85,6 +108,33 @@ class Airplane(BaseModel):
         return self.rows * self.seats_in_row
 
 
+class CrewQuerySet(models.QuerySet):
+
+    def busy_in(self, start_time, end_time, exclude_flight=None):
+        """Crew assigned to a flight overlapping [start_time, end_time)."""
+        return self.filter(self._overlapping_flight(start_time, end_time, exclude_flight))
+
+    def available_in(self, start_time, end_time, exclude_flight=None):
+        """
+        Crew with a license valid at start_time and no overlapping flight,
+        as a single NOT EXISTS anti-join.
+        """
+        return self.filter(license_expiration__gt=start_time).exclude(
+            self._overlapping_flight(start_time, end_time, exclude_flight)
+        )
+
+    @staticmethod
+    def _overlapping_flight(start_time, end_time, exclude_flight=None):
+        assignments = Flight.crew.through.objects.filter(
+            crew=OuterRef("pk"),
+            flight__departure_time__lt=end_time,
+            flight__arrival_time__gt=start_time,
+        )
+        if exclude_flight is not None:
+            assignments = assignments.exclude(flight=exclude_flight)
+        return Exists(assignments)
+
+
 class Crew(BaseModel):
     ROLE_CHOICES = (
         ("PILOT", _("Pilot"),),
@@ -98,6 +148,9 @@ class Crew(BaseModel):
     role = models.CharField(max_length=100, choices=ROLE_CHOICES)
     license_number = models.CharField(max_length=32, unique=True)
     license_expiration = models.DateTimeField()
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    objects = CrewQuerySet.as_manager()
 
     class Meta:
         verbose_name_plural = _("Crew")
@@ -114,10 +167,7 @@ class Crew(BaseModel):
         return True
 
     def is_available_in(self, start_time, end_time) -> bool:
-        return not self.flights.filter(
-            departure_time__lt=end_time,
-            arrival_time__gt=start_time
-        ).exists()
+        return not Crew.objects.filter(pk=self.pk).busy_in(start_time, end_time).exists()
 
     def __str__(self):
         return f"{self.role}: {self.first_name} {self.last_name}"
@@ -139,11 +189,13 @@ class Airport(BaseModel):
     longitude = models.DecimalField(
         max_digits=9, decimal_places=6,
     )
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     @property
     def current_time(self) -> datetime:
-        tz = pytz.timezone(self.timezone)
-        return localtime(now(), timezone=tz).isoformat()
+        if hasattr(self, "localized_current_time"):
+            return self.localized_current_time
+        return localize(now(), self.timezone)
 
     class Meta:
         verbose_name_plural = _("Airports")
@@ -158,40 +210,118 @@ class Route(BaseModel):
     destination = models.ForeignKey(Airport, on_delete=models.CASCADE, related_name="arrivals")
     stops = models.ManyToManyField(Airport, related_name="stops", blank=True)
     distance = models.IntegerField(help_text=_("Distance in kilometers"))
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     def haversine_distance(self, lat1, lon1, lat2, lon2):
         """
         Calculate the great-circle distance between two points
         on the Earth using the Haversine formula.
         """
-        lat1, lon1, lat2, lon2 = map(float, (lat1, lon1, lat2, lon2))
-        lon1, lat1, lon2, lat2 = map(radians, [lon1, lat1, lon2, lat2])
-
-        dlon = lon2 - lon1
-        dlat = lat2 - lat1
-        a = sin(dlat / 2) ** 2 + cos(lat1) * cos(lat2) * sin(dlon / 2) ** 2
-        c = 2 * asin(sqrt(a))
-        r = 6371  # Radius of Earth in kilometers
-        return round(c * r)
+        return round(float(distances.haversine(lat1, lon1, lat2, lon2)))
 
     def save(self, *args, **kwargs):
         if self.source and self.destination:
-            self.distance = self.haversine_distance(
-                self.source.latitude,
-                self.source.longitude,
-                self.destination.latitude,
-                self.destination.longitude
+            points = [self.source, self.destination]
+            if not self._state.adding:
+                through = Route.stops.through.objects.filter(route=self).order_by("id")
+                points[1:1] = [stop.airport for stop in through.select_related("airport")]
+            self.distance = distances.path_distance(
+                [point.latitude for point in points], [point.longitude for point in points]
             )
         super().save(*args, **kwargs)
 
     class Meta:
         verbose_name_plural = _("Routes")
         verbose_name = _("Route")
+        indexes = [
+            models.Index(fields=["source", "destination"], name="route_source_destination_idx"),
+        ]
 
     def __str__(self):
         return f"{self.source} -> {self.destination}"
 
 
+class FlightQuerySet(models.QuerySet):
+    """Annotations and joins used to serialize flights without per-row queries."""
+
+    def with_details(self):
+        return self.select_related(
+            "airplane__type",
+            "route__source",
+            "route__destination",
+        ).prefetch_related("crew", "route__stops")
+
+    def with_taken_seats(self):
+        return self.select_related("seat_map")
+
+    def with_occupancy(self):
+        booked_seats = (
+            Ticket.objects.filter(flight=OuterRef("pk"))
+            .order_by()
+            .values("flight")
+            .annotate(count=Count("pk"))
+            .values("count")
+        )
+        return self.annotate(
+            booked_seats=Coalesce(Subquery(booked_seats, output_field=IntegerField()), 0)
+        )
+
+    def with_flight_status(self, flight_status: str):
+        """Filter by PLANNED/IN_PROGRESS/COMPLETED on the indexed time columns."""
+        time_now = now()
+        if flight_status == "PLANNED":
+            return self.filter(departure_time__gt=time_now)
+        if flight_status == "COMPLETED":
+            return self.filter(arrival_time__lt=time_now)
+        if flight_status == "IN_PROGRESS":
+            return self.filter(departure_time__lte=time_now, arrival_time__gte=time_now)
+        return self.none()
+
+    def departing_between(self, start=None, end=None, timezones=None):
+        """
+        Filter by departure window. When timezones are given, start and end
+        are naive local times of the source airport, one UTC range per zone.
+        """
+        if timezones is None:
+            return self.filter(*self._departure_range(start, end))
+        condition = models.Q(pk__in=[])
+        for tz_name in timezones:
+            tz = get_timezone(tz_name)
+            condition |= models.Q(
+                models.Q(route__source__timezone=tz_name),
+                *self._departure_range(
+                    tz.localize(start) if start else None,
+                    tz.localize(end) if end else None,
+                ),
+            )
+        return self.filter(condition)
+
+    @staticmethod
+    def _departure_range(start, end):
+        conditions = []
+        if start:
+            conditions.append(models.Q(departure_time__gte=start))
+        if end:
+            conditions.append(models.Q(departure_time__lt=end))
+        return conditions
+
+    def with_status(self):
+        return self.annotate(
+            current_status=Case(
+                When(departure_time__gt=Now(), then=Value("PLANNED")),
+                When(arrival_time__lt=Now(), then=Value("COMPLETED")),
+                default=Value("IN_PROGRESS"),
+            )
+        )
+
+    def with_price(self):
+        """Current fare from the fare table, None where it is missing or expired."""
+        fare = Fare.objects.valid().filter(flight=OuterRef("pk")).values("amount")
+        return self.annotate(
+            current_price=Subquery(fare, output_field=DecimalField(max_digits=10, decimal_places=2))
+        )
+
+
 class Flight(BaseModel):
     airplane = models.ForeignKey(Airplane, on_delete=models.CASCADE)
     crew = models.ManyToManyField(Crew, blank=True, related_name="flights")
@@ -199,13 +329,37 @@ class Flight(BaseModel):
     departure_time = models.DateTimeField()
     arrival_time = models.DateTimeField()
 
+    objects = FlightQuerySet.as_manager()
+
     class Meta:
         ordering = ("departure_time", "arrival_time")
         verbose_name_plural = _("Flights")
         verbose_name = _("Flight")
+        indexes = [
+            models.Index(fields=["route", "departure_time"], name="flight_route_departure_idx"),
+            models.Index(fields=["departure_time", "id"], name="flight_departure_id_idx"),
+            models.Index(
+                fields=["arrival_time", "departure_time"], name="flight_arrival_departure_idx"
+            ),
+        ]
+        constraints = [
+            ExclusionConstraint(
+                name="exclude_overlapping_airplane_flights",
+                expressions=[
+                    ("airplane", RangeOperators.EQUAL),
+                    (
+                        TsTzRange("departure_time", "arrival_time", RangeBoundary()),
+                        RangeOperators.OVERLAPS,
+                    ),
+                ],
+                violation_error_message=_("Airplane is already scheduled during this flight."),
+            ),
+        ]
 
     @property
     def status(self) -> str:
+        if hasattr(self, "current_status"):
+            return self.current_status
         time_now = now()
         if self.departure_time > time_now:
             return "PLANNED"
@@ -214,38 +368,103 @@ class Flight(BaseModel):
         return "IN_PROGRESS"
 
     @property
-    def price(self) -> float:
-        if not self.arrival_time or now() > self.arrival_time:
-            return 0.0
-        base_price = self.route.distance * 0.025
-
-        if self.departure_time - now() < timedelta(days=3):
-            base_price *= 1.2
-
-        total_seats = self.airplane.total_seats
-        booked_seats = self.tickets.count()
-
-        if total_seats:
-            occupancy = booked_seats / total_seats
-            if occupancy > 0.8:
-                base_price *= 1.3
-
-        return round(base_price, 2)
+    def price(self) -> Decimal:
+        if getattr(self, "current_price", None) is None:
+            self.current_price = Fare.objects.for_flights([self]).get(self.pk)
+        return self.current_price
 
     @property
     def local_departure_time(self) -> datetime:
-        tz = pytz.timezone(self.route.source.timezone)
-        return localtime(self.departure_time, timezone=tz).isoformat()
+        if hasattr(self, "localized_departure_time"):
+            return self.localized_departure_time
+        return localize(self.departure_time, self.route.source.timezone)
 
     @property
     def local_arrival_time(self) -> datetime:
-        tz = pytz.timezone(self.route.destination.timezone)
-        return localtime(self.arrival_time, timezone=tz).isoformat()
+        if hasattr(self, "localized_arrival_time"):
+            return self.localized_arrival_time
+        return localize(self.arrival_time, self.route.destination.timezone)
 
     def __str__(self):
         return f"{self.arrival_time}:{self.departure_time}"
 
 
+class OrderQuerySet(models.QuerySet):
+
+    def cancel(self) -> dict:
+        """
+        Cancel the orders in a handful of statements, whatever their number.
+        Tickets of flights that have not departed are deleted and refunded,
+        one balance update per user, every seat of the orders is released.
+
+        Returns {order_id: {"returned_balance", "not_returnable_tickets", "balance"}},
+        balance is None for users that got no refund.
+        """
+        from user import wallet
+
+        with transaction.atomic():
+            orders = dict(
+                Order.objects.filter(pk__in=self.values("pk"))
+                .exclude(status="CANCELLED")
+                .select_for_update()
+                .values_list("pk", "user")
+            )
+            if not orders:
+                return {}
+            tickets = Ticket.objects.filter(order__in=orders).annotate(
+                returnable=ExpressionWrapper(
+                    Q(flight__departure_time__gt=Now()), output_field=BooleanField()
+                )
+            )
+            results = {
+                order_id: {"returned_balance": Decimal(0), "not_returnable_tickets": []}
+                for order_id in orders
+            }
+            refunds = {}
+            returned = []
+            seats_by_flight = {}
+            for ticket in tickets:
+                seats_by_flight.setdefault(ticket.flight_id, []).append((ticket.row, ticket.seat))
+                result = results[ticket.order_id]
+                if ticket.returnable:
+                    returned.append(ticket.pk)
+                    result["returned_balance"] += ticket.price
+                    user_id = orders[ticket.order_id]
+                    refunds[user_id] = refunds.get(user_id, Decimal(0)) + ticket.price
+                else:
+                    result["not_returnable_tickets"].append(ticket)
+
+            # Seat maps are locked before the user rows, in the same order as bookings.
+            flights = Flight.objects.filter(pk__in=seats_by_flight).select_related("airplane")
+            for flight_id, seat_map in SeatMap.objects.lock(flights).items():
+                seat_map.set_seats(seats_by_flight[flight_id], False)
+                seat_map.save(update_fields=["taken"])
+            Ticket.objects.filter(pk__in=returned).delete()
+            Fare.objects.invalidate(seats_by_flight)
+            Order.objects.filter(pk__in=orders).recalculate_total_price(status="CANCELLED")
+            balances = wallet.credit_many(refunds)
+
+        for order_id, result in results.items():
+            result["balance"] = balances.get(orders[order_id])
+        return results
+
+    def recalculate_total_price(self, **fields) -> int:
+        """Rewrite total_price of the orders from their tickets in one UPDATE."""
+        ticket_total = (
+            Ticket.objects.filter(order=OuterRef("pk"))
+            .order_by()
+            .values("order")
+            .annotate(total=Sum("price"))
+            .values("total")
+        )
+        return self.update(
+            total_price=Coalesce(
+                Subquery(ticket_total, output_field=DecimalField()), Value(Decimal(0))
+            ),
+            **fields,
+        )
+
+
 class Order(BaseModel):
     STATUS_CHOICES = (
         ("CANCELLED", _("Cancelled")),
@@ -254,18 +473,18 @@ class Order(BaseModel):
     created_at = models.DateTimeField(auto_now_add=True)
     user = models.ForeignKey("user.User", on_delete=models.CASCADE)
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default="PAID")
+    total_price = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+
+    objects = OrderQuerySet.as_manager()
 
     class Meta:
         verbose_name_plural = _("Orders")
         verbose_name = _("Order")
-
-    @property
-    def total_price(self):
-        price = Decimal(0)
-        tickets = self.tickets.all()
-        for ticket in tickets:
-            price += ticket.price
-        return price
+        indexes = [
+            models.Index(fields=["user", "created_at", "id"], name="order_user_created_idx"),
+            models.Index(fields=["user", "total_price"], name="order_user_total_price_idx"),
+            models.Index(fields=["total_price"], name="order_total_price_idx"),
+        ]
 
     def __str__(self):
         return f"{self.user} | {self.created_at}"
@@ -297,3 +516,297 @@ class Ticket(BaseModel):
 
     def __str__(self):
         return f"{self.row}:{self.seat}"
+
+
+class SeatMapQuerySet(models.QuerySet):
+
+    def for_flight(self, flight: Flight) -> "SeatMap":
+        """Seat map of the flight, built from its tickets when missing or stale."""
+        try:
+            seat_map = flight.seat_map
+        except SeatMap.DoesNotExist:
+            return self.rebuild(flight)
+        if not seat_map.matches(flight.airplane):
+            return self.rebuild(flight)
+        return seat_map
+
+    def rebuild(self, flight: Flight) -> "SeatMap":
+        layout = SeatMap(rows=flight.airplane.rows, seats_in_row=flight.airplane.seats_in_row)
+        layout.clear()
+        layout.set_seats(
+            Ticket.objects.filter(flight=flight)
+            .exclude(order__status="CANCELLED")
+            .values_list("row", "seat"),
+            True,
+        )
+        seat_map, created = self.update_or_create(
+            flight=flight,
+            defaults={
+                "rows": layout.rows,
+                "seats_in_row": layout.seats_in_row,
+                "taken": layout.taken,
+            },
+        )
+        flight.seat_map = seat_map
+        return seat_map
+
+    def lock(self, flights) -> dict:
+        """
+        Lock the seat maps of the flights in flight id order and return them by flight id.
+        Concurrent bookings of the same flight queue on this row lock.
+        """
+        flights = sorted(flights, key=lambda flight: str(flight.pk))
+        seat_maps = {
+            seat_map.flight_id: seat_map
+            for seat_map in self.select_for_update().filter(flight__in=flights).order_by("flight")
+        }
+        for flight in flights:
+            seat_map = seat_maps.get(flight.pk)
+            if seat_map is None or not seat_map.matches(flight.airplane):
+                self.rebuild(flight)
+                seat_maps[flight.pk] = self.select_for_update().get(flight=flight)
+        return seat_maps
+
+    def sync(self, seats):
+        """
+        Set the bits of (flight id, row, seat) keys from the tickets holding
+        them, under the seat map locks, e.g. after tickets were deleted
+        without releasing their seats.
+        """
+        seats_by_flight = {}
+        for flight_id, row, seat in seats:
+            seats_by_flight.setdefault(flight_id, set()).add((row, seat))
+        if not seats_by_flight:
+            return
+        with transaction.atomic():
+            flights = Flight.objects.filter(pk__in=seats_by_flight).select_related("airplane")
+            seat_maps = self.lock(flights)
+            rows = {row for keys in seats_by_flight.values() for row, seat in keys}
+            held = set(
+                Ticket.objects.filter(flight__in=seat_maps, row__in=rows)
+                .exclude(order__status="CANCELLED")
+                .values_list("flight", "row", "seat")
+            )
+            for flight_id, seat_map in seat_maps.items():
+                seats = seats_by_flight[flight_id]
+                seat_map.set_seats([key for key in seats if (flight_id, *key) not in held], False)
+                seat_map.set_seats([key for key in seats if (flight_id, *key) in held], True)
+            self.bulk_update(seat_maps.values(), ["taken"])
+
+    def occupy(self, flight: Flight, seats) -> "SeatMap":
+        return self._update(flight, seats, True)
+
+    def release(self, flight: Flight, seats) -> "SeatMap":
+        return self._update(flight, seats, False)
+
+    def _update(self, flight, seats, taken):
+        """Flip bits under a row lock, the seat map row serializes writers per flight."""
+        with transaction.atomic():
+            seat_map = self.select_for_update().filter(flight=flight).first()
+            if seat_map is None or not seat_map.matches(flight.airplane):
+                return self.rebuild(flight)
+            seat_map.set_seats(seats, taken)
+            seat_map.save(update_fields=["taken"])
+        flight.seat_map = seat_map
+        return seat_map
+
+
+class SeatMap(BaseModel):
+    """
+    Occupancy of a flight as a bitset of rows * seats_in_row bits.
+    Seat (row, seat) is bit (row - 1) * seats_in_row + seat - 1, most significant bit first.
+    """
+    flight = models.OneToOneField(Flight, on_delete=models.CASCADE, related_name="seat_map")
+    rows = models.IntegerField()
+    seats_in_row = models.IntegerField()
+    taken = models.BinaryField(default=b"")
+
+    objects = SeatMapQuerySet.as_manager()
+
+    class Meta:
+        verbose_name_plural = _("Seat Maps")
+        verbose_name = _("Seat Map")
+
+    def __str__(self):
+        return f"{self.flight_id}: {self.taken_count}/{self.total_seats}"
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if isinstance(instance.__dict__.get("taken"), memoryview):
+            instance.taken = instance.taken.tobytes()
+        return instance
+
+    @property
+    def total_seats(self) -> int:
+        return self.rows * self.seats_in_row
+
+    @property
+    def taken_count(self) -> int:
+        return sum(bin(byte).count("1") for byte in self.taken)
+
+    @property
+    def free_count(self) -> int:
+        return self.total_seats - self.taken_count
+
+    def matches(self, airplane: Airplane) -> bool:
+        return self.rows == airplane.rows and self.seats_in_row == airplane.seats_in_row
+
+    def clear(self):
+        self.taken = bytes((self.total_seats + 7) // 8)
+
+    def _bit(self, row: int, seat: int):
+        if not (1 <= row <= self.rows and 1 <= seat <= self.seats_in_row):
+            return None
+        index = (row - 1) * self.seats_in_row + seat - 1
+        return index // 8, 0x80 >> (index % 8)
+
+    def is_taken(self, row: int, seat: int) -> bool:
+        bit = self._bit(row, seat)
+        if bit is None:
+            return False
+        byte, mask = bit
+        return bool(self.taken[byte] & mask)
+
+    def is_free(self, row: int, seat: int) -> bool:
+        return self._bit(row, seat) is not None and not self.is_taken(row, seat)
+
+    def set_seats(self, seats, taken: bool):
+        bits = bytearray(self.taken)
+        for row, seat in seats:
+            bit = self._bit(row, seat)
+            if bit is None:
+                continue
+            byte, mask = bit
+            if taken:
+                bits[byte] |= mask
+            else:
+                bits[byte] &= ~mask
+        self.taken = bytes(bits)
+
+    def taken_seats(self) -> list:
+        seats = []
+        for byte_index, byte in enumerate(self.taken):
+            if not byte:
+                continue
+            for offset in range(8):
+                if byte & (0x80 >> offset):
+                    index = byte_index * 8 + offset
+                    seats.append((index // self.seats_in_row + 1, index % self.seats_in_row + 1))
+        return seats
+
+
+class FareQuerySet(models.QuerySet):
+
+    def valid(self):
+        return self.filter(Q(valid_until__isnull=True) | Q(valid_until__gt=Now()))
+
+    def for_flights(self, flights) -> dict:
+        """
+        Current fare of every flight by flight id. Missing and expired entries
+        are computed from one query and stored with a single upsert.
+        """
+        flight_ids = {getattr(flight, "pk", flight) for flight in flights}
+        current = ExpressionWrapper(
+            Q(valid_until__isnull=True) | Q(valid_until__gt=Now()), output_field=BooleanField()
+        )
+        prices, versions = {}, {}
+        for flight, amount, version, is_current in (
+            self.filter(flight__in=flight_ids)
+            .annotate(is_current=current)
+            .values_list("flight", "amount", "version", "is_current")
+        ):
+            versions[flight] = version
+            if is_current:
+                prices[flight] = amount
+        missing = flight_ids - prices.keys()
+        if missing:
+            prices.update(self.refresh({pk: versions.get(pk, 0) for pk in missing}))
+        return prices
+
+    def refresh(self, versions) -> dict:
+        """
+        Compute the fares of the flights in versions, a flight id to the
+        version of its fare read before counting seats, 0 if it had none.
+        A stored fare is only replaced while it still has that version, so a
+        price computed before a ticket change never outlives the change.
+        """
+        at = now()
+        flights = Flight.objects.filter(pk__in=versions).with_occupancy().values_list(
+            "pk",
+            "route__distance",
+            "departure_time",
+            "arrival_time",
+            "booked_seats",
+            "airplane__rows",
+            "airplane__seats_in_row",
+        )
+        prices, params = {}, []
+        for pk, distance, departure_time, arrival_time, booked, rows, seats_in_row in flights:
+            amount, valid_until = fares.quote(
+                distance, departure_time, arrival_time, booked, rows * seats_in_row, at
+            )
+            prices[pk] = amount
+            params += [uuid.uuid4(), pk, amount, valid_until, versions[pk]]
+        if prices:
+            self._execute(
+                "INSERT INTO {fares} (id, flight_id, amount, valid_until, version) "
+                f"VALUES {', '.join(['(%s, %s, %s, %s, %s)'] * len(prices))} "
+                "ON CONFLICT (flight_id) DO UPDATE "
+                "SET amount = EXCLUDED.amount, valid_until = EXCLUDED.valid_until "
+                "WHERE {fares}.version = EXCLUDED.version",
+                params,
+            )
+        return prices
+
+    def attach(self, flights):
+        """Set current_price on the flights that were not annotated with a valid fare."""
+        flights = [flight for flight in flights if getattr(flight, "current_price", None) is None]
+        if flights:
+            prices = self.for_flights(flights)
+            for flight in flights:
+                flight.current_price = prices.get(flight.pk)
+
+    def invalidate(self, flights):
+        """
+        Expire the fares of the flights, e.g. after their tickets changed, and
+        bump their version so fares computed from the old seat count are not
+        stored. Flights without a fare get an expired one to carry the version.
+        """
+        flight_ids = [str(getattr(flight, "pk", flight)) for flight in flights]
+        if flight_ids:
+            self._execute(
+                "INSERT INTO {fares} (id, flight_id, amount, valid_until, version) "
+                "SELECT gen_random_uuid(), id, 0, NOW(), 1 FROM {flights} "
+                "WHERE id = ANY(%s::uuid[]) "
+                "ON CONFLICT (flight_id) DO UPDATE "
+                "SET valid_until = NOW(), version = {fares}.version + 1",
+                [flight_ids],
+            )
+
+    @staticmethod
+    def _execute(sql: str, params: list):
+        tables = {
+            name: connection.ops.quote_name(model._meta.db_table)
+            for name, model in (("fares", Fare), ("flights", Flight))
+        }
+        with connection.cursor() as cursor:
+            cursor.execute(sql.format(**tables), params)
+
+
+class Fare(BaseModel):
+    """Materialized current fare of a flight, expires at valid_until or on ticket changes."""
+    flight = models.OneToOneField(Flight, on_delete=models.CASCADE, related_name="fare")
+    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    valid_until = models.DateTimeField(null=True, blank=True)
+    # Bumped by every invalidation; refresh only overwrites the version it read.
+    version = models.PositiveIntegerField(default=0)
+
+    objects = FareQuerySet.as_manager()
+
+    class Meta:
+        verbose_name_plural = _("Fares")
+        verbose_name = _("Fare")
+
+    def __str__(self):
+        return f"{self.flight_id}: {self.amount}"
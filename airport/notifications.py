@@ -0,0 +1,62 @@
+from itertools import islice
+
+from airport.localization import localize
+
+CHUNK_SIZE = 500
+
+
+def recipients(flight):
+    """Emails of everyone holding a ticket on the flight in a paid order, once each."""
+    from airport.models import Order
+
+    return (
+        Order.objects.filter(tickets__flight=flight, status="PAID")
+        .values_list("user__email", flat=True)
+        .distinct()
+    )
+
+
+def notify(flight, subject: str, message: str) -> int:
+    """
+    Queue one email per ticket holder of the flight. Recipients are read
+    through a cursor and queued CHUNK_SIZE at a time, one INSERT per chunk.
+    Returns how many were queued.
+    """
+    from jobs import tasks
+
+    emails = recipients(flight).iterator(chunk_size=CHUNK_SIZE)
+    count = 0
+    while chunk := list(islice(emails, CHUNK_SIZE)):
+        tasks.send_email.enqueue_many(
+            {"subject": subject, "message": message, "recipient_list": [email]}
+            for email in chunk
+        )
+        count += len(chunk)
+    return count
+
+
+def describe(flight) -> str:
+    from airport.models import Route
+
+    route = Route.objects.select_related("source", "destination").get(pk=flight.route_id)
+    return (
+        f"{route.source.IATA_code} - {route.destination.IATA_code}, departing "
+        f"{localize(flight.departure_time, route.source.timezone)} local time, arriving "
+        f"{localize(flight.arrival_time, route.destination.timezone)} local time"
+    )
+
+
+def flight_rescheduled(flight) -> int:
+    return notify(
+        flight,
+        "Your flight has been rescheduled",
+        f"Your flight has a new schedule: {describe(flight)}.",
+    )
+
+
+def flight_cancelled(flight) -> int:
+    return notify(
+        flight,
+        "Your flight has been cancelled",
+        f"Your flight has been cancelled: {describe(flight)}.",
+    )
@@ -1,10 +1,29 @@
+import base64
+import uuid
+from contextlib import contextmanager
 from decimal import Decimal
 
-from django.db import transaction
+from django.db import IntegrityError, transaction
+from drf_spectacular.utils import extend_schema_field
 from rest_framework import serializers
-from airport.models import AirplaneType, Airplane, Crew, Airport, Route, Flight, Ticket, Order
+from airport.exceptions import SeatConflict
+from airport.localization import localize_airports, localize_flights
+from airport.models import (
+    AirplaneType,
+    Airplane,
+    Crew,
+    Airport,
+    Route,
+    Fare,
+    Flight,
+    Ticket,
+    Order,
+    SeatMap,
+)
 from django.utils.translation import gettext_lazy as _
 
+from user import wallet
+
 
 class AirplaneTypeSerializer(serializers.ModelSerializer):
 
@@ -80,10 +99,20 @@ class CrewSerializer(serializers.ModelSerializer):
         )
 
 
+class BatchListSerializer(serializers.ListSerializer):
+    """Lets the child prepare the whole list at once before serializing rows."""
+
+    def to_representation(self, data):
+        items = list(data.all() if hasattr(data, "all") else data)
+        self.child.prepare(items)
+        return super().to_representation(items)
+
+
 class AirportSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Airport
+        list_serializer_class = BatchListSerializer
         fields = (
             "id",
             "name",
@@ -96,6 +125,16 @@ class AirportSerializer(serializers.ModelSerializer):
             "longitude",
         )
 
+    def prepare(self, airports):
+        localize_airports(airports)
+
+
+class AirportDistanceSerializer(AirportSerializer):
+    distance = serializers.FloatField(read_only=True, help_text=_("Distance in kilometers"))
+
+    class Meta(AirportSerializer.Meta):
+        fields = AirportSerializer.Meta.fields + ("distance",)
+
 
 class AirportNameSerializer(serializers.ModelSerializer):
 
@@ -165,6 +204,7 @@ class FLightListSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Flight
+        list_serializer_class = BatchListSerializer
         fields = (
             "id",
             "airplane_model",
@@ -181,6 +221,10 @@ class FLightListSerializer(serializers.ModelSerializer):
             "status",
         )
 
+    def prepare(self, flights):
+        localize_flights(flights)
+        Fare.objects.attach(flights)
+
     def get_crew(self, obj):
         return [member.full_name for member in obj.crew.all()]
 
@@ -192,6 +236,7 @@ class FlightSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Flight
+        list_serializer_class = BatchListSerializer
         fields = (
             "id",
             "airplane",
@@ -205,6 +250,10 @@ class FlightSerializer(serializers.ModelSerializer):
             "status"
         )
 
+    def prepare(self, flights):
+        localize_flights(flights)
+        Fare.objects.attach(flights)
+
     def validate_crew(self, crew):
         crew_list = list(crew)
         if len(crew_list) < 3:
@@ -221,38 +270,75 @@ class FlightSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError(_(
                 "Flight must include at least one FLIGHT_ATTENDANT."
             ))
-        for member in crew_list:
-            if member.is_expired:
-                raise serializers.ValidationError(
-                    _("{member} has an expired license.").format(member=member.full_name)
-                )
         return crew
 
     def validate(self, validated_data):
-        crew = validated_data.get("crew")
-        departure_time = validated_data.get("departure_time")
-        arrival_time = validated_data.get("arrival_time")
+        instance = self.instance
+        crew = validated_data.get("crew", instance.crew.all() if instance else None)
+        departure_time = validated_data.get(
+            "departure_time", getattr(instance, "departure_time", None)
+        )
+        arrival_time = validated_data.get("arrival_time", getattr(instance, "arrival_time", None))
 
         if departure_time >= arrival_time:
             raise serializers.ValidationError(_("Arrival time must be after departure time."))
-        for member in crew:
-            if not member.is_available_in(departure_time, arrival_time):
-                raise serializers.ValidationError(
-                    _(
-                        "{member} is not available during this flight."
-                    ).format(member=member.full_name)
-                )
+        if crew:
+            # Same check as the crew availability endpoint.
+            available = set(
+                Crew.objects.filter(pk__in=[member.pk for member in crew])
+                .available_in(departure_time, arrival_time, exclude_flight=instance)
+                .values_list("pk", flat=True)
+            )
+            for member in crew:
+                if member.pk in available:
+                    continue
+                if member.license_expiration <= departure_time:
+                    message = _("{member} has an expired license.")
+                else:
+                    message = _("{member} is not available during this flight.")
+                raise serializers.ValidationError(message.format(member=member.full_name))
         return validated_data
 
+    def create(self, validated_data):
+        with self.airplane_schedule():
+            return super().create(validated_data)
+
+    def update(self, instance, validated_data):
+        with self.airplane_schedule():
+            return super().update(instance, validated_data)
+
+    @contextmanager
+    def airplane_schedule(self):
+        """Map the airplane overlap exclusion constraint to a validation error."""
+        try:
+            with transaction.atomic():
+                yield
+        except IntegrityError as error:
+            if "exclude_overlapping_airplane_flights" not in str(error):
+                raise
+            raise serializers.ValidationError(
+                {"airplane": _("Airplane is already scheduled during this flight.")}
+            )
+
+
+class ItinerarySerializer(serializers.Serializer):
+    flights = FLightListSerializer(many=True)
+    connections = serializers.IntegerField()
+    departure_time = serializers.DateTimeField()
+    arrival_time = serializers.DateTimeField()
+    duration = serializers.DurationField()
+    total_price = serializers.DecimalField(max_digits=10, decimal_places=2)
+
 
 class FlightDetailSerializer(serializers.ModelSerializer):
     airplane = AirplaneListSerializer(read_only=True)
-    crew = CrewSerializer(read_only=True)
+    crew = CrewSerializer(many=True, read_only=True)
     route = RouteListSerializer(read_only=True)
     taken_seats = serializers.SerializerMethodField()
 
     class Meta:
         model = Flight
+        list_serializer_class = BatchListSerializer
         fields = (
             "id",
             "airplane",
@@ -267,20 +353,45 @@ class FlightDetailSerializer(serializers.ModelSerializer):
             "taken_seats"
         )
 
+    def prepare(self, flights):
+        localize_flights(flights)
+        Fare.objects.attach(flights)
+
     def get_taken_seats(self, obj):
-        taken_seats = []
-        for ticket in obj.tickets.all():
-            if ticket.order.status != "CANCELLED":
-                taken_seats.append(
-                    {
-                        "row": ticket.row,
-                        "seat": ticket.seat,
-                    }
-                )
-        return taken_seats
+        seat_map = SeatMap.objects.for_flight(obj)
+        return [{"row": row, "seat": seat} for row, seat in seat_map.taken_seats()]
+
+
+class SeatMapSerializer(serializers.ModelSerializer):
+    taken = serializers.SerializerMethodField()
+
+    class Meta:
+        model = SeatMap
+        fields = (
+            "flight",
+            "rows",
+            "seats_in_row",
+            "free_count",
+            "taken",
+        )
+
+    def get_taken(self, obj) -> str:
+        """Base64 of the bitset, one bit per seat, row by row, most significant bit first."""
+        return base64.b64encode(obj.taken).decode("ascii")
+
+
+class BookableFlightField(serializers.PrimaryKeyRelatedField):
+    """Resolve flights from the batch OrderCreateSerializer loads for the whole order."""
+
+    def to_internal_value(self, data):
+        flight = self.context.get("flights", {}).get(str(data))
+        if flight is not None:
+            return flight
+        return super().to_internal_value(data)
 
 
 class TicketSerializer(serializers.ModelSerializer):
+    flight = BookableFlightField(queryset=Flight.objects.all())
 
     class Meta:
         model = Ticket
@@ -292,21 +403,14 @@ class TicketSerializer(serializers.ModelSerializer):
             "price",
         )
         read_only_fields = ("id", "price")
+        # Seat uniqueness is checked for the whole order in OrderCreateSerializer.
+        validators = []
 
     def validate(self, data):
         row = data.get("row")
         seat = data.get("seat")
         flight = data.get("flight")
 
-        if Ticket.objects.filter(row=row, seat=seat, flight=flight).exists():
-            raise serializers.ValidationError(
-                {
-                    "seat":
-                        _(
-                            "Seat {row}-{seat} is already taken for this flight."
-                        ).format(row=row, seat=seat)
-                }
-            )
         if flight.status != "PLANNED":
             raise serializers.ValidationError({"flight": _("Flight is completed or ongoing.")})
         if int(row) > flight.airplane.rows or int(seat) > flight.airplane.seats_in_row:
@@ -314,10 +418,6 @@ class TicketSerializer(serializers.ModelSerializer):
         return data
 
 
-class TicketDetailSerializer(TicketSerializer):
-    flight = FlightDetailSerializer(read_only=True)
-
-
 class OrderCreateSerializer(serializers.ModelSerializer):
     tickets = TicketSerializer(many=True, read_only=False, allow_empty=False)
 
@@ -328,38 +428,121 @@ class OrderCreateSerializer(serializers.ModelSerializer):
             "tickets",
         )
 
-    def create(self, validated_data):
-        tickets_data = validated_data.pop("tickets")
-        user = self.context["request"].user
-        seen_seats = set()
+    def to_internal_value(self, data):
+        self.context["flights"] = self.load_flights(data)
+        return super().to_internal_value(data)
+
+    @staticmethod
+    def load_flights(data) -> dict:
+        """Fetch every flight of the order once, with its fare and status."""
+        tickets = data.get("tickets") if hasattr(data, "get") else None
+        if not isinstance(tickets, list):
+            return {}
+        flight_ids = set()
+        for ticket in tickets:
+            try:
+                flight_ids.add(uuid.UUID(str(ticket.get("flight"))))
+            except (AttributeError, ValueError):
+                continue
+        flights = list(
+            Flight.objects.filter(pk__in=flight_ids)
+            .select_related("airplane", "route")
+            .with_price()
+            .with_status()
+        )
+        Fare.objects.attach(flights)
+        return {str(flight.pk): flight for flight in flights}
 
+    def validate_tickets(self, tickets_data):
+        seen_seats = set()
         for ticket_data in tickets_data:
-            key = (ticket_data["row"], ticket_data["seat"], ticket_data["flight"].id)
+            key = (ticket_data["flight"].pk, ticket_data["row"], ticket_data["seat"])
             if key in seen_seats:
-                raise serializers.ValidationError({
-                    "tickets":
-                        _(
-                            "Duplicate seat {row}-{seat} in this order for the same flight."
-                        ).format(row=ticket_data["row"], seat=ticket_data["seat"])
-                })
-            seen_seats.add(key)
-
-        with transaction.atomic():
-            order = Order.objects.create(user=user, **validated_data)
-            for ticket_data in tickets_data:
-                flight = ticket_data.get("flight")
-                price = Decimal(flight.price)
-                Ticket.objects.create(order=order, price=price, **ticket_data)
-            price = Decimal(order.total_price)
-            if user.balance < price:
                 raise serializers.ValidationError(
                     _(
-                        "Not enough on balance, {balance}$ < {price}$."
-                    ).format(balance=user.balance, price=price)
+                        "Duplicate seat {row}-{seat} in this order for the same flight."
+                    ).format(row=ticket_data["row"], seat=ticket_data["seat"])
                 )
-            user.balance = user.balance - price
-            user.save()
-            return order
+            seen_seats.add(key)
+
+        taken = self.taken_seats(seen_seats)
+        if taken:
+            raise SeatConflict(taken)
+        return tickets_data
+
+    @staticmethod
+    def taken_seats(seats) -> set:
+        """Requested (flight, row, seat) keys that already have a ticket, in one query."""
+        flights = {flight for flight, row, seat in seats}
+        rows = {row for flight, row, seat in seats}
+        existing = Ticket.objects.filter(flight__in=flights, row__in=rows).values_list(
+            "flight", "row", "seat"
+        )
+        return set(existing) & seats
+
+    def create(self, validated_data):
+        tickets_data = validated_data.pop("tickets")
+        user = self.context["request"].user
+
+        tickets = []
+        seats_by_flight = {}
+        for ticket_data in tickets_data:
+            flight = ticket_data["flight"]
+            tickets.append(Ticket(price=flight.price, **ticket_data))
+            seats_by_flight.setdefault(flight, []).append(
+                (ticket_data["row"], ticket_data["seat"])
+            )
+        price = sum((ticket.price for ticket in tickets), Decimal(0))
+
+        try:
+            with transaction.atomic():
+                self.reserve(seats_by_flight)
+                order = Order.objects.create(user=user, total_price=price, **validated_data)
+                for ticket in tickets:
+                    ticket.order = order
+                Ticket.objects.bulk_create(tickets)
+                Fare.objects.invalidate(seats_by_flight)
+                # Last statement, so the user row is locked only until commit.
+                user.balance = wallet.debit(user.pk, price)
+                return order
+        except wallet.InsufficientFunds as error:
+            raise serializers.ValidationError(
+                _(
+                    "Not enough on balance, {balance}$ < {price}$."
+                ).format(balance=error.balance, price=price)
+            )
+        except IntegrityError as error:
+            if "unique_ticket_seat_and_flight" not in str(error):
+                raise
+            requested = {
+                (flight.pk, row, seat)
+                for flight, seats in seats_by_flight.items()
+                for row, seat in seats
+            }
+            raise SeatConflict(self.taken_seats(requested))
+
+    @classmethod
+    def reserve(cls, seats_by_flight):
+        """
+        Take the seats on the locked seat maps or raise SeatConflict listing the
+        seats another order already holds.
+        """
+        seat_maps = SeatMap.objects.lock(seats_by_flight)
+        conflicts = [
+            (flight.pk, row, seat)
+            for flight, seats in seats_by_flight.items()
+            for row, seat in seats
+            if seat_maps[flight.pk].is_taken(row, seat)
+        ]
+        if conflicts:
+            # Bits can outlive their tickets, trust them only when a ticket agrees.
+            taken = cls.taken_seats(set(conflicts))
+            if taken:
+                raise SeatConflict(taken)
+        for flight, seats in seats_by_flight.items():
+            seat_map = seat_maps[flight.pk]
+            seat_map.set_seats(seats, True)
+            seat_map.save(update_fields=["taken"])
 
 
 class OrderSerializer(serializers.ModelSerializer):
@@ -376,7 +559,20 @@ class OrderSerializer(serializers.ModelSerializer):
 
 
 class OrderDetailSerializer(OrderSerializer):
-    tickets = TicketDetailSerializer(many=True, read_only=True)
+    """Tickets reference their flight by id, each distinct flight is serialized once."""
+    flights = serializers.SerializerMethodField()
+
+    class Meta(OrderSerializer.Meta):
+        fields = OrderSerializer.Meta.fields + ("flights",)
+
+    @extend_schema_field(FlightDetailSerializer(many=True))
+    def get_flights(self, obj):
+        flights = {}
+        for ticket in obj.tickets.all():
+            flights.setdefault(ticket.flight_id, ticket.flight)
+        return FlightDetailSerializer(
+            flights.values(), many=True, context=self.context
+        ).data
 
 
 class ReturnBalanceSerializer(serializers.Serializer):
@@ -1,9 +1,26 @@
 import os
+import threading
 
-from django.db.models.signals import pre_save, post_delete
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.signals import m2m_changed, pre_delete, pre_save, post_save, post_delete
 from django.dispatch import receiver
+from django.utils.timezone import now
 
-from airport.models import Airplane
+from airport import caching, distances, notifications
+from airport.itinerary import graph
+from airport.models import (
+    Airplane,
+    AirplaneType,
+    Airport,
+    Fare,
+    Flight,
+    Route,
+    SeatMap,
+    Ticket,
+)
+
+_batches = threading.local()
 
 
 @receiver(pre_save, sender=Airplane)
@@ -23,3 +40,128 @@ def airplane_delete_handler(sender, instance, **kwargs):
     if instance.image:
         if os.path.isfile(instance.image.path):
             os.remove(instance.image.path)
+
+
+@receiver(post_save, sender=Flight)
+@receiver(post_delete, sender=Flight)
+def flight_change_handler(sender, instance, **kwargs):
+    graph.invalidate([instance.pk])
+    if kwargs.get("created") is False:
+        Fare.objects.invalidate([instance])
+
+
+def on_commit_once(func, *values):
+    """
+    Collect values during the current transaction and call func with all of
+    them once it commits, rather than once per signal. A batch dropped by a
+    rollback is replaced by a fresh one. Errors are logged, not raised.
+    """
+    connection = transaction.get_connection()
+    pending = _batches.__dict__.setdefault("pending", {})
+    flush = pending.get(func)
+    if (
+        flush is not None
+        and not flush.done
+        and any(callback is flush for _, callback, _ in connection.run_on_commit)
+    ):
+        flush.values.update(values)
+        return
+
+    def flush():
+        flush.done = True
+        func(flush.values)
+
+    flush.values, flush.done = set(values), False
+    pending[func] = flush
+    transaction.on_commit(flush, robust=True)
+
+
+@receiver(post_delete, sender=Ticket)
+def ticket_delete_handler(sender, instance, **kwargs):
+    on_commit_once(SeatMap.objects.sync, (instance.flight_id, instance.row, instance.seat))
+
+
+@receiver(post_save, sender=Ticket)
+@receiver(post_delete, sender=Ticket)
+def ticket_change_handler(sender, instance, **kwargs):
+    on_commit_once(Fare.objects.invalidate, instance.flight_id)
+
+
+@receiver(pre_save, sender=Flight)
+def flight_schedule_handler(sender, instance, **kwargs):
+    if not instance._state.adding:
+        instance.previous_schedule = (
+            sender.objects.filter(pk=instance.pk)
+            .values_list("departure_time", "arrival_time")
+            .first()
+        )
+
+
+@receiver(post_save, sender=Flight)
+def flight_reschedule_handler(sender, instance, created, **kwargs):
+    previous = getattr(instance, "previous_schedule", None)
+    if created or previous is None:
+        return
+    del instance.previous_schedule
+    if previous != (instance.departure_time, instance.arrival_time) and previous[1] > now():
+        notifications.flight_rescheduled(instance)
+
+
+@receiver(pre_delete, sender=Flight)
+def flight_cancel_handler(sender, instance, **kwargs):
+    if instance.arrival_time > now():
+        notifications.flight_cancelled(instance)
+
+
+@receiver(post_save, sender=Route)
+def route_change_handler(sender, instance, created, **kwargs):
+    if not created:
+        flights = list(instance.flights.values_list("pk", flat=True))
+        graph.invalidate(flights)
+        Fare.objects.invalidate(flights)
+
+
+@receiver(post_save, sender=Airplane)
+def airplane_change_handler(sender, instance, created, **kwargs):
+    if not created:
+        Fare.objects.invalidate(
+            Flight.objects.filter(airplane=instance).values_list("pk", flat=True)
+        )
+
+
+@receiver(post_save, sender=AirplaneType)
+def airplane_type_change_handler(sender, instance, created, **kwargs):
+    if not created:
+        instance.airplanes.update(updated_at=now())
+
+
+@receiver(post_save, sender=Airport)
+def airport_save_handler(sender, instance, created, **kwargs):
+    if not created:
+        distances.recompute_routes(airport_ids=[instance.pk])
+        Route.objects.filter(
+            Q(source=instance) | Q(destination=instance) | Q(stops=instance)
+        ).update(updated_at=now())
+
+
+@receiver(m2m_changed, sender=Route.stops.through)
+def route_stops_handler(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    route_ids = [instance.pk] if not reverse else pk_set
+    if route_ids:
+        distances.recompute_routes(route_ids=route_ids)
+        Route.objects.filter(pk__in=route_ids).update(updated_at=now())
+
+
+@receiver(post_save, sender=Airport)
+@receiver(post_delete, sender=Airport)
+@receiver(post_save, sender=AirplaneType)
+@receiver(post_delete, sender=AirplaneType)
+@receiver(post_save, sender=Route)
+@receiver(post_delete, sender=Route)
+@receiver(m2m_changed, sender=Route.stops.through)
+def cached_responses_handler(sender, **kwargs):
+    if kwargs.get("action", "post_").startswith("post_"):
+        # After commit, or a read in between would cache the old rows as current.
+        transaction.on_commit(caching.invalidate)
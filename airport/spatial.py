@@ -0,0 +1,75 @@
+import threading
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+from airport.distances import EARTH_RADIUS, airports_version
+
+_lock = threading.Lock()
+_index = None
+_version = None
+
+
+def unit_vectors(latitudes, longitudes) -> np.ndarray:
+    latitudes = np.radians(np.asarray(latitudes, dtype=np.float64))
+    longitudes = np.radians(np.asarray(longitudes, dtype=np.float64))
+    return np.column_stack((
+        np.cos(latitudes) * np.cos(longitudes),
+        np.cos(latitudes) * np.sin(longitudes),
+        np.sin(latitudes),
+    ))
+
+
+def chord_to_km(chord):
+    return 2 * EARTH_RADIUS * np.arcsin(np.clip(chord / 2, 0, 1))
+
+
+def km_to_chord(km):
+    return 2 * np.sin(min(km / EARTH_RADIUS, np.pi) / 2)
+
+
+class AirportIndex:
+    """
+    k-d tree over airports as points on the unit sphere. Straight-line
+    (chord) distance between unit vectors grows with great-circle distance,
+    so Euclidean nearest neighbours are the nearest airports.
+    """
+
+    def __init__(self, airports):
+        airports = list(airports)
+        self.ids = [pk for pk, _, _ in airports]
+        self.tree = cKDTree(
+            unit_vectors(
+                [latitude for _, latitude, _ in airports],
+                [longitude for _, _, longitude in airports],
+            ).reshape(-1, 3)
+        )
+
+    def nearest(self, latitude, longitude, count, radius=None) -> list:
+        """Up to count (airport id, km) pairs by distance, optionally within radius km."""
+        count = min(count, len(self.ids))
+        if not count:
+            return []
+        chords, positions = self.tree.query(
+            unit_vectors([latitude], [longitude])[0],
+            k=[*range(1, count + 1)],
+            distance_upper_bound=np.inf if radius is None else km_to_chord(radius),
+        )
+        return [
+            (self.ids[position], float(km))
+            for position, km in zip(positions, chord_to_km(chords))
+            if position < len(self.ids)
+        ]
+
+
+def index() -> AirportIndex:
+    """The airport index, kept per process and rebuilt when the airports' version changes."""
+    global _index, _version
+    from airport.models import Airport
+
+    version = airports_version()
+    with _lock:
+        if _index is None or _version != version:
+            _index = AirportIndex(Airport.objects.values_list("pk", "latitude", "longitude"))
+            _version = version
+        return _index
@@ -8,7 +8,8 @@ from airport.views import (
     CrewViewSet,
     AirportViewSet,
     FlightViewSet,
-    OrderViewSet
+    OrderViewSet,
+    ExportView,
 )
 
 router = DefaultRouter()
@@ -23,6 +24,7 @@ router.register("me/orders", OrderViewSet, basename="order")
 
 urlpatterns = [
     path("", include(router.urls)),
+    path("exports/<str:name>/", ExportView.as_view(), name="export"),
 ]
 
 
@@ -1,14 +1,36 @@
-from datetime import timedelta
+from datetime import datetime, time, timedelta, timezone
+from decimal import Decimal, InvalidOperation
 
-from django.db import transaction
-from django.utils.timezone import now
-from drf_spectacular.utils import extend_schema
+from django.db.models import Avg, Max, Prefetch, Q
+from django.db.models.functions import Greatest
+from django.http import StreamingHttpResponse
+from django.utils.dateparse import parse_datetime
+from django.utils.timezone import now, is_aware, make_aware
+from drf_spectacular.types import OpenApiTypes
+from drf_spectacular.utils import extend_schema, OpenApiParameter
 from rest_framework import viewsets, status, permissions, mixins
 from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound, ValidationError
 from rest_framework.response import Response
+from rest_framework.views import APIView
 from rest_framework.viewsets import GenericViewSet
 
-from airport.models import AirplaneType, Airplane, Crew, Airport, Route, Flight, Order
+from airport_api.pagination import FlightPagination, OrderPagination
+from airport import exports, spatial
+from airport.itinerary import graph
+from airport.localization import get_timezone
+from airport.mixins import CachedResponseMixin, ConditionalGetMixin
+from airport.models import (
+    AirplaneType,
+    Airplane,
+    Crew,
+    Airport,
+    Route,
+    Fare,
+    Flight,
+    Order,
+    SeatMap,
+)
 from airport.permissions import IsAdminOrAuthenticatedReadOnly
 from airport.serializers import (
     AirplaneTypeSerializer,
@@ -17,16 +39,19 @@ from airport.serializers import (
     AirplaneImageSerializer,
     CrewSerializer,
     AirportSerializer,
+    AirportDistanceSerializer,
     RouteListSerializer,
     RouteDetailSerializer,
     RouteSerializer,
     FLightListSerializer,
     FlightDetailSerializer,
     FlightSerializer,
+    ItinerarySerializer,
     OrderCreateSerializer,
     OrderSerializer,
     OrderDetailSerializer,
-    ReturnBalanceSerializer
+    ReturnBalanceSerializer,
+    SeatMapSerializer,
 )
 from django.utils.translation import gettext as _
 
@@ -34,14 +59,14 @@ from user.serializers import EmptySerializer
 
 
 @extend_schema(tags=["Airplane Type"])
-class AirplaneTypeViewSet(viewsets.ModelViewSet):
+class AirplaneTypeViewSet(CachedResponseMixin, ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = AirplaneType.objects.all()
     serializer_class = AirplaneTypeSerializer
     permission_classes = (IsAdminOrAuthenticatedReadOnly,)
 
 
 @extend_schema(tags=["Airplane"])
-class AirplaneViewSet(viewsets.ModelViewSet):
+class AirplaneViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = Airplane.objects.all()
     permission_classes = (IsAdminOrAuthenticatedReadOnly,)
 
@@ -86,23 +111,136 @@ class AirplaneViewSet(viewsets.ModelViewSet):
 
 
 @extend_schema(tags=["Crew"])
-class CrewViewSet(viewsets.ModelViewSet):
+class CrewViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = Crew.objects.all()
     serializer_class = CrewSerializer
     permission_classes = (IsAdminOrAuthenticatedReadOnly,)
 
+    def version_aggregates(self):
+        # is_expired flips without a write, so a license expiring counts as
+        # a modification at its expiration time.
+        aggregates = super().version_aggregates()
+        aggregates["last_modified"] = Greatest(
+            aggregates["last_modified"],
+            Max("license_expiration", filter=Q(license_expiration__lte=now())),
+        )
+        return aggregates
+
+    @extend_schema(
+        parameters=[
+            OpenApiParameter("start", OpenApiTypes.DATETIME, required=True),
+            OpenApiParameter("end", OpenApiTypes.DATETIME, required=True),
+            OpenApiParameter("role", OpenApiTypes.STR),
+        ],
+        responses={200: OpenApiTypes.OBJECT},
+    )
+    @action(detail=False, methods=["get"], url_name="available")
+    def available(self, request):
+        """Crew free for the whole window with a license valid at its start, by role."""
+        start_time = self.parse_time("start")
+        end_time = self.parse_time("end")
+        if start_time >= end_time:
+            raise ValidationError({"end": _("End must be after start.")})
+        queryset = Crew.objects.available_in(start_time, end_time).order_by(
+            "role", "last_name", "first_name"
+        )
+        role = request.GET.get("role", None)
+        if role:
+            queryset = queryset.filter(role=role.upper())
+        data = {}
+        for member in self.get_serializer(queryset, many=True).data:
+            data.setdefault(member["role"], []).append(member)
+        return Response(data, status=status.HTTP_200_OK)
+
+    def parse_time(self, param):
+        value = self.request.GET.get(param, None)
+        try:
+            parsed = parse_datetime(value) if value else None
+        except ValueError:
+            parsed = None
+        if parsed is None:
+            raise ValidationError({param: _("Invalid date.")})
+        if not is_aware(parsed):
+            parsed = make_aware(parsed, timezone.utc)
+        return parsed
+
 
 @extend_schema(tags=["Airport"])
 class AirportViewSet(viewsets.ModelViewSet):
     queryset = Airport.objects.all()
     serializer_class = AirportSerializer
     permission_classes = (IsAdminOrAuthenticatedReadOnly,)
+    max_nearest = 100
+
+    def get_serializer_class(self):
+        if self.action == "nearest":
+            return AirportDistanceSerializer
+        return AirportSerializer
+
+    @extend_schema(
+        parameters=[
+            OpenApiParameter("latitude", OpenApiTypes.FLOAT),
+            OpenApiParameter("longitude", OpenApiTypes.FLOAT),
+            OpenApiParameter("city", OpenApiTypes.STR),
+            OpenApiParameter("radius", OpenApiTypes.FLOAT, description=_("Kilometers")),
+            OpenApiParameter("limit", OpenApiTypes.INT),
+        ],
+        responses=AirportDistanceSerializer(many=True),
+    )
+    @action(detail=False, methods=["get"], url_name="nearest")
+    def nearest(self, request):
+        """
+        Airports nearest to a point, or to the airports of a city, closest
+        first. Radius limits the search to that many kilometers.
+        """
+        latitude, longitude = self.parse_point()
+        radius = self.parse_number("radius", float, None)
+        limit = min(max(self.parse_number("limit", int, 10), 1), self.max_nearest)
+        if radius is not None and radius < 0:
+            raise ValidationError({"radius": _("Must not be negative.")})
+        found = spatial.index().nearest(latitude, longitude, limit, radius)
+        airports = Airport.objects.in_bulk([pk for pk, distance in found])
+        results = []
+        for pk, distance in found:
+            if pk in airports:
+                airports[pk].distance = round(distance, 1)
+                results.append(airports[pk])
+        serializer = self.get_serializer(results, many=True)
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+    def parse_point(self):
+        city = self.request.GET.get("city", None)
+        if city:
+            point = Airport.objects.filter(closest_big_city__iexact=city).aggregate(
+                latitude=Avg("latitude"), longitude=Avg("longitude")
+            )
+            if point["latitude"] is None:
+                raise ValidationError({"city": _("Unknown city.")})
+            return point["latitude"], point["longitude"]
+        latitude = self.parse_number("latitude", float, None)
+        longitude = self.parse_number("longitude", float, None)
+        if latitude is None or not -90 <= latitude <= 90:
+            raise ValidationError({"latitude": _("Latitude must be between -90 and 90.")})
+        if longitude is None or not -180 <= longitude <= 180:
+            raise ValidationError({"longitude": _("Longitude must be between -180 and 180.")})
+        return latitude, longitude
+
+    def parse_number(self, param, number_type, default):
+        value = self.request.GET.get(param, None)
+        if not value:
+            return default
+        try:
+            return number_type(value)
+        except ValueError:
+            raise ValidationError({param: _("Must be a number.")})
 
 
 @extend_schema(tags=["Routes"])
-class RouteViewSet(viewsets.ModelViewSet):
+class RouteViewSet(CachedResponseMixin, ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = Route.objects.all()
     permission_classes = (IsAdminOrAuthenticatedReadOnly,)
+    # Route details nest airports with their current time.
+    cached_actions = conditional_actions = ("list",)
 
     def get_queryset(self):
         queryset = Route.objects.all().select_related("source", "destination")
@@ -127,18 +265,152 @@ class RouteViewSet(viewsets.ModelViewSet):
         return RouteSerializer
 
 
+def parse_bound(request, param, end=False, tz=None):
+    """exports.parse_bound on a query parameter, reporting errors against it."""
+    try:
+        return exports.parse_bound(request.GET.get(param, None), end, tz)
+    except ValueError:
+        raise ValidationError({param: _("Invalid date.")})
+
+
 @extend_schema(tags=["Flights"])
 class FlightViewSet(viewsets.ModelViewSet):
     queryset = Flight.objects.all()
     permission_classes = (IsAdminOrAuthenticatedReadOnly,)
+    pagination_class = FlightPagination
+    max_connections = 3
+
+    def get_queryset(self):
+        queryset = Flight.objects.all()
+        if self.action in ("list", "retrieve"):
+            queryset = queryset.with_details().with_price().with_status()
+        if self.action in ("retrieve", "seat_map"):
+            queryset = queryset.select_related("airplane").with_taken_seats()
+        return self.search(queryset)
+
+    def search(self, queryset):
+        source = self.request.GET.get("source", None)
+        destination = self.request.GET.get("destination", None)
+        manufacturer = self.request.GET.get("manufacturer", None)
+        flight_status = self.request.GET.get("status", None)
+        local_time = self.request.GET.get("local_time", "").lower() == "true"
+        departure_from = self.parse_departure("departure_from", local_time)
+        departure_to = self.parse_departure("departure_to", local_time, end=True)
+
+        if source:
+            queryset = queryset.filter(route__source__IATA_code=source.upper())
+        if destination:
+            queryset = queryset.filter(route__destination__IATA_code=destination.upper())
+        if manufacturer:
+            queryset = queryset.filter(airplane__manufacturer=manufacturer.upper())
+        if flight_status:
+            queryset = queryset.with_flight_status(flight_status.upper())
+        if departure_from or departure_to:
+            timezones = None
+            if local_time:
+                airports = Airport.objects.filter(departures__isnull=False)
+                if source:
+                    airports = airports.filter(IATA_code=source.upper())
+                timezones = set(airports.values_list("timezone", flat=True))
+            queryset = queryset.departing_between(departure_from, departure_to, timezones)
+        return queryset
+
+    def parse_departure(self, param, local_time, end=False):
+        """
+        Read a date or datetime query parameter. A bare date covers the whole
+        day, naive values are UTC unless local_time is set.
+        """
+        parsed = parse_bound(self.request, param, end, None if local_time else timezone.utc)
+        if local_time and parsed is not None and is_aware(parsed):
+            raise ValidationError({param: _("Local time must not include an offset.")})
+        return parsed
 
     def get_serializer_class(self):
         if self.action == "list":
             return FLightListSerializer
         elif self.action == "retrieve":
             return FlightDetailSerializer
+        elif self.action == "seat_map":
+            return SeatMapSerializer
+        elif self.action == "itineraries":
+            return ItinerarySerializer
         return FlightSerializer
 
+    @action(detail=True, methods=["get"], url_path="seat-map", url_name="seat-map")
+    def seat_map(self, request, pk=None):
+        flight = self.get_object()
+        seat_map = SeatMap.objects.for_flight(flight)
+        data = self.get_serializer(seat_map).data
+        row = request.GET.get("row", None)
+        seat = request.GET.get("seat", None)
+        if row and seat:
+            try:
+                data["is_free"] = seat_map.is_free(int(row), int(seat))
+            except ValueError:
+                raise ValidationError({"seat": _("Row and seat must be integers.")})
+        return Response(data, status=status.HTTP_200_OK)
+
+    @extend_schema(
+        parameters=[
+            OpenApiParameter("source", OpenApiTypes.STR, required=True),
+            OpenApiParameter("destination", OpenApiTypes.STR, required=True),
+            OpenApiParameter("date", OpenApiTypes.DATE),
+            OpenApiParameter("max_connections", OpenApiTypes.INT),
+            OpenApiParameter("order_by", OpenApiTypes.STR, enum=["duration", "price"]),
+        ],
+        responses=ItinerarySerializer(many=True),
+    )
+    @action(detail=False, methods=["get"], url_name="itineraries")
+    def itineraries(self, request):
+        """
+        Itineraries with up to max_connections changes, searched in memory.
+        The date is the local departure date at the source airport.
+        """
+        codes = {param: request.GET.get(param, "").upper() for param in ("source", "destination")}
+        airports = Airport.objects.in_bulk(codes.values(), field_name="IATA_code")
+        for param, code in codes.items():
+            if code not in airports:
+                raise ValidationError({param: _("Unknown airport.")})
+        source, destination = airports[codes["source"]], airports[codes["destination"]]
+        try:
+            max_connections = int(request.GET.get("max_connections", 1))
+        except ValueError:
+            raise ValidationError({"max_connections": _("Must be an integer.")})
+        max_connections = min(max(max_connections, 0), self.max_connections)
+        order_by = request.GET.get("order_by", "duration")
+        if order_by not in ("duration", "price"):
+            raise ValidationError({"order_by": _("Must be duration or price.")})
+
+        source_tz = get_timezone(source.timezone)
+        day = self.parse_departure("date", local_time=True)
+        if day is None:
+            day = datetime.combine(now().astimezone(source_tz).date(), time.min)
+        start = max(source_tz.localize(day), now())
+        end = source_tz.localize(day + timedelta(days=1))
+
+        found = graph.search(source.pk, destination.pk, start, end, max_connections, order_by)
+        flights = Flight.objects.with_details().with_price().with_status().in_bulk(
+            {leg.flight for legs in found for leg in legs}
+        )
+        Fare.objects.attach(flights.values())
+        itineraries = []
+        for legs in found:
+            if any(leg.flight not in flights for leg in legs):
+                continue
+            path = [flights[leg.flight] for leg in legs]
+            itineraries.append({
+                "flights": path,
+                "connections": len(path) - 1,
+                "departure_time": path[0].departure_time,
+                "arrival_time": path[-1].arrival_time,
+                "duration": path[-1].arrival_time - path[0].departure_time,
+                "total_price": sum(flight.price for flight in path),
+            })
+        if order_by == "price":
+            itineraries.sort(key=lambda itinerary: itinerary["total_price"])
+        serializer = self.get_serializer(itineraries, many=True)
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
 
 @extend_schema(tags=["Orders"])
 class OrderViewSet(mixins.CreateModelMixin,
@@ -146,10 +418,27 @@ class OrderViewSet(mixins.CreateModelMixin,
                    mixins.ListModelMixin,
                    GenericViewSet):
     permission_classes = (permissions.IsAuthenticated,)
+    pagination_class = OrderPagination
 
     def get_queryset(self):
         user = self.request.user
         queryset = Order.objects.all().filter(user=user)
+        if self.action == "list":
+            queryset = queryset.prefetch_related("tickets")
+        if self.action == "retrieve":
+            flights = Flight.objects.with_details().with_price().with_status().with_taken_seats()
+            queryset = queryset.prefetch_related(
+                "tickets", Prefetch("tickets__flight", queryset=flights)
+            )
+        min_total = self.request.GET.get("min_total", None)
+        max_total = self.request.GET.get("max_total", None)
+        try:
+            if min_total:
+                queryset = queryset.filter(total_price__gte=Decimal(min_total))
+            if max_total:
+                queryset = queryset.filter(total_price__lte=Decimal(max_total))
+        except InvalidOperation:
+            raise ValidationError({"detail": _("Invalid total.")})
         return queryset
 
     def get_serializer_class(self):
@@ -166,9 +455,8 @@ class OrderViewSet(mixins.CreateModelMixin,
     def cancel(self, request, pk=None):
         order = self.get_object()
         today = now().date()
-        user = order.user
         created_date = order.created_at.date()
-        if order.status == "CANCELED":
+        if order.status == "CANCELLED":
             return Response(
                 {"detail": _("Order already cancelled.")},
                 status=status.HTTP_409_CONFLICT
@@ -178,30 +466,52 @@ class OrderViewSet(mixins.CreateModelMixin,
                 {"detail": _("Order older than 14 days cannot be cancelled")},
                 status=status.HTTP_400_BAD_REQUEST
             )
-        if order.tickets.all().count() < 1:
+        if not order.tickets.exists():
             return Response(
                 {"detail": _("No tickets provided.")},
                 status=status.HTTP_400_BAD_REQUEST
             )
-        with transaction.atomic():
-            return_balance = 0
-            not_returnable = []
-            for ticket in order.tickets.all():
-                if ticket.flight.status != "PLANNED":
-                    not_returnable.append(ticket)
-                    continue
-                else:
-                    return_balance += ticket.price
-                    ticket.delete()
-            user.balance = user.balance + return_balance
-            user.save()
-            order.status = "CANCELED"
-            order.save()
-        data = {
-            "tickets": not_returnable,
-            "returned_balance": return_balance,
-            "balance": user.balance,
-        }
-        serializer = self.get_serializer(data=data)
-        serializer.is_valid(raise_exception=True)
+        result = Order.objects.filter(pk=order.pk).cancel().get(order.pk)
+        if result is None:
+            return Response(
+                {"detail": _("Order already cancelled.")},
+                status=status.HTTP_409_CONFLICT
+            )
+        if result["balance"] is None:
+            result["balance"] = request.user.balance
+        serializer = self.get_serializer(result)
         return Response(serializer.data, status=status.HTTP_200_OK)
+
+
+@extend_schema(
+    tags=["Export"],
+    parameters=[
+        OpenApiParameter("file_format", OpenApiTypes.STR, enum=list(exports.CONTENT_TYPES)),
+        OpenApiParameter("from", OpenApiTypes.DATETIME),
+        OpenApiParameter("to", OpenApiTypes.DATETIME),
+        OpenApiParameter("status", OpenApiTypes.STR),
+    ],
+    responses={200: OpenApiTypes.BINARY},
+)
+class ExportView(APIView):
+    """
+    Stream flights, tickets, orders or transactions as NDJSON or CSV, read
+    from the database in chunks. Dates are UTC; a bare "to" date is inclusive.
+    """
+
+    permission_classes = (permissions.IsAdminUser,)
+
+    def get(self, request, name=None):
+        if name not in exports.EXPORTS:
+            raise NotFound(_("Unknown export."))
+        file_format = request.GET.get("file_format", "ndjson").lower()
+        if file_format not in exports.CONTENT_TYPES:
+            raise ValidationError({"file_format": _("Must be ndjson or csv.")})
+        start = parse_bound(request, "from", tz=timezone.utc)
+        end = parse_bound(request, "to", end=True, tz=timezone.utc)
+        response = StreamingHttpResponse(
+            exports.stream(name, file_format, start, end, request.GET.get("status", None)),
+            content_type=exports.CONTENT_TYPES[file_format],
+        )
+        response["Content-Disposition"] = f'attachment; filename="{name}.{file_format}"'
+        return response
@@ -0,0 +1,174 @@
+import base64
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor pagination over a (sort column, id) pair.
+
+    The cursor stores the key of the edge row, so every page is a range scan
+    on the composite index that starts right after it, without OFFSET or COUNT(*).
+    """
+    cursor_query_param = "cursor"
+    page_size = 20
+    page_size_query_param = "page_size"
+    max_page_size = 100
+    ordering = ("created", "id")
+    invalid_cursor_message = _("Invalid cursor")
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.cursor = self.decode_cursor(request, queryset.model)
+        position, reverse = self.cursor if self.cursor else (None, False)
+
+        ordering = self.reversed_ordering() if reverse else self.ordering
+        queryset = queryset.order_by(*ordering)
+        if position is not None:
+            queryset = queryset.filter(self.after(ordering, position))
+
+        results = list(queryset[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        self.page = results[:self.page_size]
+        if reverse:
+            self.page.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, position is not None
+        return self.page
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(page_size, 1), self.max_page_size)
+
+    def reversed_ordering(self):
+        return tuple(
+            field[1:] if field.startswith("-") else f"-{field}" for field in self.ordering
+        )
+
+    @staticmethod
+    def after(ordering, position):
+        """Row-value comparison (field, id) > (value, pk) in the given direction."""
+        (field, tiebreaker), (value, pk) = ordering, position
+        field_lookup = "lt" if field.startswith("-") else "gt"
+        tiebreaker_lookup = "lt" if tiebreaker.startswith("-") else "gt"
+        field, tiebreaker = field.lstrip("-"), tiebreaker.lstrip("-")
+        return Q(**{f"{field}__{field_lookup}e": value}) & (
+            Q(**{f"{field}__{field_lookup}": value})
+            | Q(**{f"{tiebreaker}__{tiebreaker_lookup}": pk})
+        )
+
+    def key(self, instance):
+        return [getattr(instance, field.lstrip("-")) for field in self.ordering]
+
+    @staticmethod
+    def serialize_value(value):
+        if hasattr(value, "isoformat"):
+            return value.isoformat()
+        return str(value)
+
+    def decode_cursor(self, request, model):
+        """Cursor position parsed by the model's ordering fields, and its direction."""
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+        try:
+            data = json.loads(base64.urlsafe_b64decode(encoded.encode("ascii")))
+            values, reverse = data["p"], bool(data["r"])
+            if not isinstance(values, list) or len(values) != len(self.ordering):
+                raise ValueError
+            position = [
+                model._meta.get_field(field.lstrip("-")).to_python(value)
+                for field, value in zip(self.ordering, values)
+            ]
+            if None in position:
+                raise ValueError
+        except (TypeError, ValueError, KeyError, UnicodeEncodeError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+        return position, reverse
+
+    def encode_cursor(self, position, reverse):
+        data = json.dumps(
+            {"p": [self.serialize_value(value) for value in position], "r": reverse},
+            separators=(",", ":"),
+        )
+        encoded = base64.urlsafe_b64encode(data.encode("ascii")).decode("ascii")
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        if not self.page:
+            return self.encode_cursor(self.cursor[0], False)
+        return self.encode_cursor(self.key(self.page[-1]), False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return self.encode_cursor(self.cursor[0], True)
+        return self.encode_cursor(self.key(self.page[0]), True)
+
+    def get_paginated_response(self, data):
+        return Response({
+            "next": self.get_next_link(),
+            "previous": self.get_previous_link(),
+            "results": data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "required": ["results"],
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "previous": {"type": "string", "nullable": True, "format": "uri"},
+                "results": schema,
+            },
+        }
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                "name": self.cursor_query_param,
+                "required": False,
+                "in": "query",
+                "description": str(_("The pagination cursor value.")),
+                "schema": {"type": "string"},
+            },
+            {
+                "name": self.page_size_query_param,
+                "required": False,
+                "in": "query",
+                "description": str(_("Number of results to return per page.")),
+                "schema": {"type": "integer"},
+            },
+        ]
+
+
+class FlightPagination(KeysetPagination):
+    ordering = ("departure_time", "id")
+
+
+class OrderPagination(KeysetPagination):
+    ordering = ("-created_at", "-id")
+
+
+class TransactionPagination(KeysetPagination):
+    ordering = ("-date", "-id")
+
+
+class UserPagination(KeysetPagination):
+    ordering = ("date_joined", "id")
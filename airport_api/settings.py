@@ -1,4 +1,5 @@
 import os
+import tempfile
 from datetime import timedelta
 from pathlib import Path
 from dotenv import load_dotenv
@@ -22,7 +23,7 @@ USE_EMAIL_VERIFICATION = os.getenv("USE_EMAIL_VERIFICATION").lower() == "true"
 EMAIL_BACKEND = "django.core.mail.backends.smtp.EmailBackend"
 EMAIL_HOST = os.getenv("SMTP_HOST")
 EMAIL_PORT = os.getenv("SMTP_PORT")
-EMAIL_USE_TLS = True
+EMAIL_USE_TLS = os.getenv("SMTP_USE_TLS", "True").lower() == "true"
 EMAIL_HOST_USER = os.getenv("SMTP_HOST_USER")
 EMAIL_HOST_PASSWORD = os.getenv("SMTP_PASSWORD")
 DEFAULT_FROM_EMAIL = os.getenv("SMTP_DEFAULT_FROM_EMAIL")
@@ -45,12 +46,14 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",
     "debug_toolbar",
     "rest_framework",
     "rest_framework_simplejwt",
     "drf_spectacular",
     "airport",
     "user",
+    "jobs",
 ]
 
 
@@ -71,6 +74,19 @@ ROOT_URLCONF = "airport_api.urls"
 WSGI_APPLICATION = "airport_api.wsgi.application"
 
 
+# Cached responses are invalidated by bumping a counter in this cache, so it
+# must be shared by every process serving requests: LocMemCache only works
+# with a single process. Stampede protection relies on an atomic add(), which
+# Redis and Memcached provide and the file based cache does not.
+CACHES = {
+    "default": {
+        "BACKEND": os.getenv(
+            "CACHE_BACKEND", "django.core.cache.backends.filebased.FileBasedCache"
+        ),
+        "LOCATION": os.getenv("CACHE_LOCATION", os.path.join(tempfile.gettempdir(), "airport-api")),
+    }
+}
+
 DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.postgresql",
@@ -0,0 +1,42 @@
+import logging
+from time import perf_counter
+
+from django.core.mail import get_connection
+
+logger = logging.getLogger(__name__)
+
+
+def dispatch(messages) -> list:
+    """
+    Send messages over one SMTP connection and return an exception or None
+    for each. A message the server rejects doesn't stop the rest; if the
+    connection can't be opened, every message gets that error.
+    """
+    messages = list(messages)
+    if not messages:
+        return []
+    started = perf_counter()
+    connection = get_connection()
+    try:
+        connection.open()
+    except Exception as e:
+        return [e] * len(messages)
+
+    errors = []
+    try:
+        for message in messages:
+            try:
+                connection.send_messages([message])
+                errors.append(None)
+            except Exception as e:
+                errors.append(e)
+    finally:
+        connection.close()
+
+    elapsed = perf_counter() - started
+    sent = errors.count(None)
+    logger.info(
+        f"Sent {sent} of {len(messages)} emails in {elapsed:.3f}s "
+        f"({sent / elapsed if elapsed else 0:.1f}/s)"
+    )
+    return errors
@@ -0,0 +1,29 @@
+from datetime import timedelta
+
+from django.core.management import BaseCommand
+
+from jobs import queue
+
+
+class Command(BaseCommand):
+    help = "Show queue depth and throughput of each task."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--window", type=int, default=15, help="Minutes to measure throughput over."
+        )
+
+    def handle(self, *args, **options):
+        window = max(options["window"], 1)
+        rows = queue.stats(timedelta(minutes=window))
+        if not rows:
+            self.stdout.write("No jobs.")
+            return
+        self.stdout.write(
+            f"{'task':<40} {'pending':>8} {'due':>8} {'done':>8} {'failed':>8} {'per min':>8}"
+        )
+        for row in rows:
+            self.stdout.write(
+                f"{row['task']:<40} {row['pending']:>8} {row['due']:>8} {row['done']:>8} "
+                f"{row['failed']:>8} {row['done'] / window:>8.1f}"
+            )
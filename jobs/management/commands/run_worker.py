@@ -0,0 +1,54 @@
+import signal
+import threading
+
+from django.core.management import BaseCommand
+from django.db import connection
+
+from jobs import queue
+
+
+class Command(BaseCommand):
+    help = "Run queued jobs until stopped, polling the database for due ones."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--concurrency", type=int, default=1, help="Worker threads.")
+        parser.add_argument(
+            "--poll-interval", type=float, default=1.0, help="Seconds to wait when idle."
+        )
+        parser.add_argument(
+            "--once", action="store_true", help="Exit once no jobs are due."
+        )
+
+    def handle(self, *args, **options):
+        stop = threading.Event()
+        processed = []
+
+        def work():
+            try:
+                while not stop.is_set():
+                    jobs = queue.run_next()
+                    if jobs:
+                        processed.extend(job.status for job in jobs)
+                    elif options["once"]:
+                        break
+                    else:
+                        stop.wait(options["poll_interval"])
+            finally:
+                connection.close()
+
+        signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+        threads = [threading.Thread(target=work) for _ in range(max(options["concurrency"], 1))]
+        self.stdout.write(f"Starting {len(threads)} worker(s)...")
+        for thread in threads:
+            thread.start()
+        try:
+            for thread in threads:
+                while thread.is_alive():
+                    thread.join(0.5)
+        except KeyboardInterrupt:
+            stop.set()
+            for thread in threads:
+                thread.join()
+        self.stdout.write(
+            f"Ran {len(processed)} job(s), {processed.count('FAILED')} failed for good."
+        )
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.4 on 2026-10-17 06:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("jobs", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="job",
+            index=models.Index(fields=["finished_at"], name="job_finished_at_idx"),
+        ),
+    ]
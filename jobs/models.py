@@ -0,0 +1,38 @@
+import uuid
+
+from django.db import models
+from django.db.models import Q
+from django.utils.timezone import now
+from django.utils.translation import gettext_lazy as _
+
+
+class Job(models.Model):
+    STATUS_CHOICES = (
+        ("PENDING", _("Pending")),
+        ("DONE", _("Done")),
+        ("FAILED", _("Failed")),
+    )
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    task = models.CharField(max_length=255)
+    kwargs = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="PENDING")
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    run_at = models.DateTimeField(default=now)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+
+    class Meta:
+        ordering = ["run_at"]
+        verbose_name_plural = _("Jobs")
+        verbose_name = _("Job")
+        indexes = [
+            models.Index(
+                fields=["run_at"], condition=Q(status="PENDING"), name="job_pending_run_at_idx"
+            ),
+            models.Index(fields=["finished_at"], name="job_finished_at_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.task} {self.status}"
@@ -0,0 +1,178 @@
+import logging
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Count, Q
+from django.utils.timezone import now
+
+from jobs.models import Job
+
+DEFAULT_MAX_ATTEMPTS = 5
+# Retries wait BACKOFF_BASE, then twice as long each time, up to BACKOFF_MAX.
+BACKOFF_BASE = timedelta(seconds=10)
+BACKOFF_MAX = timedelta(hours=1)
+
+logger = logging.getLogger(__name__)
+_tasks = {}
+
+
+class Task:
+    """
+    A function workers can run from the queue by its registered name. Batched
+    tasks get the kwargs of up to batch_size due jobs as a list and return an
+    exception or None for each of them.
+    """
+
+    def __init__(self, func, name, max_attempts, batch_size=None):
+        self.func = func
+        self.name = name
+        self.max_attempts = max_attempts
+        self.batch_size = batch_size
+
+    def __call__(self, *args, **kwargs):
+        return self.func(*args, **kwargs)
+
+    def enqueue(self, delay: timedelta = None, **kwargs) -> Job:
+        """
+        Queue a run with JSON-serializable kwargs. The row is written in the
+        current transaction, so workers only see it once that commits and
+        never if it rolls back.
+        """
+        return Job.objects.create(
+            task=self.name,
+            kwargs=kwargs,
+            max_attempts=self.max_attempts,
+            run_at=now() + (delay or timedelta()),
+        )
+
+    def enqueue_many(self, kwargs_list, delay: timedelta = None) -> list:
+        """Queue a run per kwargs in one INSERT."""
+        run_at = now() + (delay or timedelta())
+        return Job.objects.bulk_create(
+            Job(task=self.name, kwargs=kwargs, max_attempts=self.max_attempts, run_at=run_at)
+            for kwargs in kwargs_list
+        )
+
+
+def task(func=None, *, name=None, max_attempts=DEFAULT_MAX_ATTEMPTS, batch_size=None):
+    """Register a function as a task, named after its module and function by default."""
+
+    def register(func):
+        registered = Task(
+            func, name or f"{func.__module__}.{func.__name__}", max_attempts, batch_size
+        )
+        _tasks[registered.name] = registered
+        return registered
+
+    return register(func) if func else register
+
+
+def backoff(attempts: int) -> timedelta:
+    return min(BACKOFF_BASE * 2 ** (attempts - 1), BACKOFF_MAX)
+
+
+def _run(jobs) -> list:
+    """Run the jobs' task and return an exception or None per job."""
+    registered = _tasks.get(jobs[0].task)
+    try:
+        with transaction.atomic():
+            if registered is None:
+                raise LookupError(f"Unknown task {jobs[0].task}")
+            if registered.batch_size:
+                return registered.func([job.kwargs for job in jobs])
+            registered.func(**jobs[0].kwargs)
+            return [None]
+    except Exception as e:
+        return [e] * len(jobs)
+
+
+def _claim() -> list:
+    """
+    Lock the earliest due job, with up to batch_size due jobs of the same
+    task if it is batched, and commit the attempt before anything runs: the
+    attempt count goes up and run_at moves to when a retry would be due, so
+    a worker that dies mid-run still uses up an attempt and the job comes
+    back after the usual backoff. Jobs whose last attempt never finished
+    are marked failed instead of being claimed again.
+    """
+    with transaction.atomic():
+        due = (
+            Job.objects.select_for_update(skip_locked=True)
+            .filter(status="PENDING", run_at__lte=now())
+            .order_by("run_at")
+        )
+        job = due.first()
+        if job is None:
+            return []
+        jobs = [job]
+        registered = _tasks.get(job.task)
+        if registered is not None and registered.batch_size:
+            jobs = list(due.filter(task=job.task)[:registered.batch_size])
+
+        moment = now()
+        for job in jobs:
+            if job.attempts >= job.max_attempts:
+                logger.warning(f"Job {job.task} {job.pk} stopped during its last attempt")
+                job.status, job.finished_at = "FAILED", moment
+                job.last_error = "Worker stopped during the last attempt."
+                continue
+            job.attempts += 1
+            job.run_at = moment + backoff(job.attempts)
+        Job.objects.bulk_update(jobs, ["status", "attempts", "run_at", "finished_at", "last_error"])
+        return jobs
+
+
+def run_next() -> list:
+    """
+    Run the earliest due job, with up to batch_size due jobs of the same task
+    if it is batched, and return them; empty if nothing is due. Claimed jobs
+    are locked again while they run, so other workers pass over them with
+    FOR UPDATE SKIP LOCKED even if they outlast their backoff.
+    """
+    jobs = _claim()
+    claimed = [job for job in jobs if job.status == "PENDING"]
+    if not claimed:
+        return jobs
+    with transaction.atomic():
+        list(Job.objects.select_for_update().filter(pk__in=[job.pk for job in claimed]))
+        moment = now()
+        for job, error in zip(claimed, _run(claimed)):
+            if error is None:
+                job.status, job.finished_at, job.last_error = "DONE", moment, ""
+                continue
+            logger.warning(f"Job {job.task} {job.pk} failed, attempt {job.attempts}: {error!r}")
+            job.last_error = repr(error)
+            if job.attempts >= job.max_attempts:
+                job.status, job.finished_at = "FAILED", moment
+            else:
+                job.run_at = moment + backoff(job.attempts)
+        Job.objects.bulk_update(claimed, ["status", "run_at", "finished_at", "last_error"])
+    return jobs
+
+
+def run_pending() -> int:
+    """Run due jobs until none are left and return how many ran."""
+    count = 0
+    while jobs := run_next():
+        count += len(jobs)
+    return count
+
+
+def stats(window: timedelta) -> list:
+    """
+    Queue depth and recent throughput per task: pending and due jobs, and
+    jobs finished or given up on within the window.
+    """
+    moment = now()
+    since = moment - window
+    return list(
+        Job.objects.filter(Q(status="PENDING") | Q(finished_at__gte=since))
+        .values("task")
+        .annotate(
+            pending=Count("pk", filter=Q(status="PENDING")),
+            due=Count("pk", filter=Q(status="PENDING", run_at__lte=moment)),
+            done=Count("pk", filter=Q(status="DONE", finished_at__gte=since)),
+            failed=Count("pk", filter=Q(status="FAILED", finished_at__gte=since)),
+        )
+        .order_by("task")
+    )
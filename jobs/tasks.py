@@ -0,0 +1,29 @@
+import logging
+
+from django.core.mail import EmailMessage
+
+from airport_api import settings
+from jobs import mail
+from jobs.models import Job
+from jobs.queue import task
+
+EMAIL_BATCH_SIZE = 100
+
+logger = logging.getLogger(__name__)
+
+
+@task(batch_size=EMAIL_BATCH_SIZE)
+def send_email(batch: list) -> list:
+    """Send queued emails, up to EMAIL_BATCH_SIZE over one SMTP connection."""
+    errors = mail.dispatch(
+        EmailMessage(
+            kwargs["subject"],
+            kwargs["message"],
+            settings.DEFAULT_FROM_EMAIL,
+            kwargs["recipient_list"],
+        )
+        for kwargs in batch
+    )
+    depth = Job.objects.filter(task=send_email.name, status="PENDING").count()
+    logger.info(f"{depth} emails left in queue")
+    return errors
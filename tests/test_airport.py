@@ -1,18 +1,41 @@
+import base64
+import json
 import os
 import tempfile
-from datetime import timedelta
+import time
+import uuid
+from importlib import import_module
+from datetime import datetime, timedelta
 from decimal import Decimal
+from io import StringIO
+from unittest.mock import patch
 
+import pytz
 from PIL import Image
+from django.apps import apps as django_apps
+from django.core import mail
+from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, connection, transaction
 from django.test import TestCase, override_settings
-from django.utils.timezone import now
+from django.test.utils import CaptureQueriesContext
+from django.utils import translation
+from django.utils.timezone import localtime, now
 from rest_framework import status
 from rest_framework.reverse import reverse
 from rest_framework.test import APITestCase
 
-from airport.models import AirplaneType, Airplane, Crew, Flight, Airport, Route, Order, Ticket
-from tests.test_user import sample_user
+from airport.models import (
+    AirplaneType, Airplane, Crew, Fare, Flight, Airport, Route, Order, Ticket, SeatMap
+)
+from airport import caching, distances, exports, fixtures
+from airport.itinerary import graph
+from airport.localization import localize_flights, localize_many
+from airport.serializers import OrderCreateSerializer
+from jobs import queue, tasks
+from jobs.models import Job
+from tests.test_user import USER_MODEL, sample_user
 
 MEDIA_ROOT = tempfile.mkdtemp()
 
@@ -110,6 +133,85 @@ class TestRouteDistance(TestCase):
             f"Expected distance {expected_distance}, got {route.distance}"
         )
 
+    def test_route_distance_with_stops(self):
+        route = Route.objects.create(source=self.source, destination=self.destination)
+        stop = Airport.objects.create(
+            name="Chopin Airport",
+            IATA_code="WAW",
+            ICAO_code="EPWA",
+            closest_big_city="Warsaw",
+            timezone="Europe/Warsaw",
+            latitude=Decimal("52.165833"),
+            longitude=Decimal("20.967222"),
+        )
+        route.stops.add(stop)
+        route.refresh_from_db()
+        matrix = distances.DistanceMatrix(
+            Airport.objects.values_list("pk", "latitude", "longitude")
+        )
+        self.assertEqual(
+            route.distance,
+            round(
+                matrix.km[matrix.index[self.source.pk], matrix.index[stop.pk]]
+                + matrix.km[matrix.index[stop.pk], matrix.index[self.destination.pk]]
+            ),
+        )
+        self.assertGreater(route.distance, matrix.distance(self.source.pk, self.destination.pk))
+
+        route.save()
+        route.refresh_from_db()
+        self.assertEqual(
+            route.distance,
+            matrix.path_distance([self.source.pk, stop.pk, self.destination.pk]),
+        )
+
+    def test_airport_move_recomputes_routes(self):
+        route = Route.objects.create(source=self.source, destination=self.destination)
+        self.destination.latitude = Decimal("48.353889")
+        self.destination.longitude = Decimal("11.786111")
+        self.destination.save()
+
+        route.refresh_from_db()
+        self.assertEqual(
+            route.distance,
+            route.haversine_distance(
+                self.source.latitude,
+                self.source.longitude,
+                self.destination.latitude,
+                self.destination.longitude,
+            ),
+        )
+        distances.recompute_routes()
+        with self.assertNumQueries(3):
+            self.assertEqual(distances.recompute_routes(), 0)
+
+    def test_recompute_routes_after_writes_without_signals(self):
+        route = Route.objects.create(source=self.source, destination=self.destination)
+        # Writes from another process, or a bulk load, reach no signal here.
+        Airport.objects.filter(pk=self.destination.pk).update(
+            latitude=Decimal("48.353889"), longitude=Decimal("11.786111"), updated_at=now()
+        )
+        stop = Airport.objects.bulk_create([
+            Airport(
+                name="Chopin Airport",
+                IATA_code="WAW",
+                ICAO_code="EPWA",
+                closest_big_city="Warsaw",
+                latitude=Decimal("52.165833"),
+                longitude=Decimal("20.967222"),
+            )
+        ])[0]
+        Route.stops.through.objects.create(route=route, airport=stop)
+
+        self.assertEqual(distances.recompute_routes(), 1)
+        route.refresh_from_db()
+        self.assertEqual(
+            route.distance,
+            distances.path_distance(
+                ["50.345000", "52.165833", "48.353889"], ["30.894722", "20.967222", "11.786111"]
+            ),
+        )
+
 
 class TestFlightCreation(APITestCase):
 
@@ -211,6 +313,12 @@ class TestFlightCreation(APITestCase):
         self.assertEqual(Flight.objects.count(), 0)
         self.assertIn(f"{self.crew_pilot.full_name} has an expired license.", response.content.decode())
 
+        self.crew_pilot.license_expiration = self.departure_time - timedelta(minutes=1)
+        self.crew_pilot.save()
+        response = self.client.post(self.flight_url, self.data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn(f"{self.crew_pilot.full_name} has an expired license.", response.content.decode())
+
     def test_create_flight_without_required_role(self):
         crews = [
             ([self.crew_engineer.pk, self.crew_copilot.pk, self.crew_attendant.pk], "Flight must include a PILOT."),
@@ -227,6 +335,102 @@ class TestFlightCreation(APITestCase):
             self.assertIn(message, response.content.decode())
 
 
+    def test_crew_availability(self):
+        self.data["crew"] = [self.crew_pilot.pk, self.crew_copilot.pk, self.crew_attendant.pk]
+        res = self.client.post(self.flight_url, self.data, format="json")
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        Crew.objects.create(
+            first_name="Old",
+            last_name="License",
+            role="ENGINEER",
+            license_number="LIC005",
+            license_expiration=self.departure_time - timedelta(minutes=1),
+        )
+
+        url = reverse("airport:crew-available")
+        res = self.client.get(url, {
+            "start": (self.departure_time + timedelta(hours=1)).isoformat(),
+            "end": (self.arrival_time + timedelta(hours=1)).isoformat(),
+        })
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(list(res.data), ["ENGINEER"])
+        self.assertEqual(res.data["ENGINEER"][0]["id"], str(self.crew_engineer.pk))
+
+        res = self.client.get(url, {
+            "start": self.arrival_time.isoformat(),
+            "end": (self.arrival_time + timedelta(hours=1)).isoformat(),
+            "role": "pilot",
+        })
+        self.assertEqual([member["id"] for member in res.data["PILOT"]], [str(self.crew_pilot.pk)])
+
+        res = self.client.get(url, {"start": "tomorrow"})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_crew_overlap_validation(self):
+        self.data["crew"] = [self.crew_pilot.pk, self.crew_copilot.pk, self.crew_attendant.pk]
+        res = self.client.post(self.flight_url, self.data, format="json")
+        flight_url = reverse("airport:flight-detail", kwargs={"pk": res.data["id"]})
+        res = self.client.put(flight_url, self.data, format="json")
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        res = self.client.post(self.flight_url, self.data, format="json")
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("is not available during this flight", res.content.decode())
+
+    def test_airplane_overlap_constraint(self):
+        Flight.objects.create(
+            airplane=self.airplane,
+            route=self.route,
+            departure_time=self.departure_time + timedelta(hours=1),
+            arrival_time=self.arrival_time + timedelta(hours=1),
+        )
+        self.data["crew"] = [self.crew_pilot.pk, self.crew_copilot.pk, self.crew_attendant.pk]
+
+        res = self.client.post(self.flight_url, self.data, format="json")
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("airplane", res.data)
+        self.assertEqual(Flight.objects.count(), 1)
+
+        self.data["departure_time"] = (self.arrival_time + timedelta(hours=1)).isoformat()
+        self.data["arrival_time"] = (self.arrival_time + timedelta(hours=3)).isoformat()
+        res = self.client.post(self.flight_url, self.data, format="json")
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Flight.objects.bulk_create([
+                Flight(
+                    airplane=self.airplane,
+                    route=self.route,
+                    departure_time=self.departure_time,
+                    arrival_time=self.arrival_time,
+                ),
+            ])
+
+    def test_overlap_migration_reports_flights(self):
+        migration = import_module(
+            "airport.migrations.0013_flight_exclude_overlapping_airplane_flights"
+        )
+        with connection.schema_editor() as schema_editor:
+            migration.check_overlapping_flights(django_apps, schema_editor)
+            constraint, = (
+                constraint
+                for constraint in Flight._meta.constraints
+                if constraint.name == "exclude_overlapping_airplane_flights"
+            )
+            schema_editor.remove_constraint(Flight, constraint)
+            flights = Flight.objects.bulk_create([
+                Flight(
+                    airplane=self.airplane,
+                    route=self.route,
+                    departure_time=self.departure_time + timedelta(hours=hours),
+                    arrival_time=self.arrival_time + timedelta(hours=hours),
+                )
+                for hours in (0, 1)
+            ])
+            with self.assertRaisesMessage(RuntimeError, f"overlaps flight {flights[1].pk}"):
+                migration.check_overlapping_flights(django_apps, schema_editor)
+
+
 class TestUserOrder(APITestCase):
 
     def setUp(self):
@@ -376,8 +580,232 @@ class TestUserOrder(APITestCase):
             ]
         }
         res = self.client.post(self.url, payload, content_type="application/json")
-        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
-        self.assertIn("The fields row, seat, flight must make a unique set.", res.content.decode())
+        self.assertEqual(res.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(
+            res.data["conflicts"], [{"flight": str(self.flight.pk), "row": 1, "seat": 1}]
+        )
+
+    def count_order_queries(self, seats):
+        payload = {
+            "tickets": [
+                {"row": row, "seat": seat, "flight": str(self.flight.pk)} for row, seat in seats
+            ]
+        }
+        with CaptureQueriesContext(connection) as context:
+            res = self.client.post(self.url, payload, content_type="application/json")
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        return len(context.captured_queries)
+
+    def test_bulk_order_query_count(self):
+        self.user.balance = 5000
+        self.user.save()
+        SeatMap.objects.rebuild(self.flight)
+        small = self.count_order_queries([(1, 1), (1, 2)])
+        large = self.count_order_queries([(row, seat) for row in (2, 3) for seat in range(1, 11)])
+        self.assertEqual(small, large)
+        order = Order.objects.order_by("-created_at").first()
+        self.assertEqual(order.tickets.count(), 20)
+        self.user.refresh_from_db()
+        spent = sum(order.total_price for order in Order.objects.all())
+        self.assertEqual(self.user.balance, Decimal(5000) - spent)
+
+    def test_order_updates_seat_map(self):
+        payload = {
+            "tickets": [
+                {"row": 2, "seat": 3, "flight": str(self.flight.pk)},
+                {"row": 10, "seat": 10, "flight": str(self.flight.pk)},
+            ]
+        }
+        res = self.client.post(self.url, payload, content_type="application/json")
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        seat_map = SeatMap.objects.get(flight=self.flight)
+        self.assertTrue(seat_map.is_taken(2, 3))
+        self.assertTrue(seat_map.is_taken(10, 10))
+        self.assertTrue(seat_map.is_free(3, 2))
+        self.assertFalse(seat_map.is_free(11, 1))
+        self.assertEqual(seat_map.taken_seats(), [(2, 3), (10, 10)])
+
+        order = Order.objects.get(pk=res.data["id"])
+        self.assertEqual(order.total_price, sum(ticket.price for ticket in order.tickets.all()))
+        res = self.client.get(self.url, {"min_total": order.total_price})
+        self.assertEqual(len(res.data["results"]), 1)
+        res = self.client.get(self.url, {"max_total": order.total_price - 1})
+        self.assertEqual(len(res.data["results"]), 0)
+
+        url = reverse("airport:order-cancel", kwargs={"pk": order.pk})
+        res = self.client.post(url)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        seat_map.refresh_from_db()
+        self.assertEqual(seat_map.taken_seats(), [])
+        order.refresh_from_db()
+        self.assertEqual(order.status, "CANCELLED")
+        self.assertEqual(order.total_price, 0)
+
+    def test_seat_map_endpoint(self):
+        order = Order.objects.create(user=self.user)
+        Ticket.objects.create(flight=self.flight, row=1, seat=2, order=order, price=1)
+        url = reverse("airport:flight-seat-map", kwargs={"pk": self.flight.pk})
+        res = self.client.get(url, {"row": 1, "seat": 2})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertFalse(res.data["is_free"])
+        self.assertEqual(res.data["free_count"], 99)
+        taken = base64.b64decode(res.data["taken"])
+        self.assertEqual(len(taken), 13)
+        self.assertEqual(taken[0], 0b01000000)
+
+    def test_cancel_keeps_departed_tickets(self):
+        departed = Flight.objects.create(
+            airplane=self.airplane,
+            route=self.flight.route,
+            departure_time=now() - timedelta(hours=1),
+            arrival_time=now() + timedelta(hours=1),
+        )
+        order = Order.objects.create(user=self.user, total_price=30)
+        Ticket.objects.create(flight=self.flight, row=1, seat=1, order=order, price=10)
+        kept = Ticket.objects.create(flight=departed, row=1, seat=1, order=order, price=20)
+
+        url = reverse("airport:order-cancel", kwargs={"pk": order.pk})
+        res = self.client.post(url)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data["returned_balance"], "10.00")
+        self.assertEqual(res.data["balance"], "510.00")
+        self.assertEqual(
+            [ticket["id"] for ticket in res.data["not_returnable_tickets"]], [str(kept.pk)]
+        )
+        order.refresh_from_db()
+        self.assertEqual(order.status, "CANCELLED")
+        self.assertEqual(order.total_price, 20)
+        self.assertEqual(list(order.tickets.all()), [kept])
+        res = self.client.post(url)
+        self.assertEqual(res.status_code, status.HTTP_409_CONFLICT)
+
+    def test_flight_change_notifications(self):
+        users = [sample_user(email=f"passenger{index}@test.com") for index in range(30)]
+        for index, user in enumerate(users):
+            order = Order.objects.create(user=user)
+            for seat in (1, 2):
+                Ticket.objects.create(
+                    flight=self.flight, row=index % 10 + 1, seat=index // 10 * 2 + seat,
+                    order=order, price=1,
+                )
+        cancelled = Order.objects.create(user=self.user, status="CANCELLED")
+        Ticket.objects.create(flight=self.flight, row=10, seat=10, order=cancelled, price=1)
+
+        self.flight.save()
+        self.assertFalse(Job.objects.exists())
+
+        self.flight.departure_time += timedelta(hours=2)
+        self.flight.arrival_time += timedelta(hours=2)
+        with self.assertNumQueries(6):
+            self.flight.save()
+        jobs = Job.objects.filter(task=tasks.send_email.name)
+        self.assertEqual(
+            sorted(job.kwargs["recipient_list"][0] for job in jobs),
+            sorted(user.email for user in users),
+        )
+        self.assertIn("KBP - FRA", jobs[0].kwargs["message"])
+        jobs.delete()
+
+        self.flight.delete()
+        notices = Job.objects.filter(task=tasks.send_email.name)
+        self.assertEqual(notices.count(), 30)
+        self.assertEqual(notices.first().kwargs["subject"], "Your flight has been cancelled")
+        queue.run_pending()
+        self.assertEqual(len(mail.outbox), 30)
+
+    def test_bulk_cancel_query_count(self):
+        def cancel_orders(count):
+            orders = []
+            with self.captureOnCommitCallbacks(execute=True):
+                for index in range(count):
+                    user = sample_user(email=f"bulk{count}-{index}@test.com")
+                    order = Order.objects.create(user=user, total_price=5)
+                    Ticket.objects.create(
+                        flight=self.flight, row=count, seat=index + 1, order=order, price=5
+                    )
+                    orders.append(order)
+            SeatMap.objects.rebuild(self.flight)
+            # Commit callbacks run too: ticket signals must not add a query per ticket.
+            with CaptureQueriesContext(connection) as context:
+                with self.captureOnCommitCallbacks(execute=True) as callbacks:
+                    results = Order.objects.filter(pk__in=[o.pk for o in orders]).cancel()
+            self.assertEqual(len(callbacks), 2)
+            self.assertEqual(len(results), count)
+            for result in results.values():
+                self.assertEqual(result["balance"], Decimal(5))
+            return len(context.captured_queries)
+
+        self.assertEqual(cancel_orders(2), cancel_orders(8))
+        self.assertEqual(Ticket.objects.count(), 0)
+        self.assertEqual(SeatMap.objects.get(flight=self.flight).taken_seats(), [])
+
+    def test_order_detail_serializes_flight_once(self):
+        order = Order.objects.create(user=self.user)
+        SeatMap.objects.rebuild(self.flight)
+        Fare.objects.for_flights([self.flight])
+
+        def count_detail_queries():
+            url = reverse("airport:order-detail", kwargs={"pk": order.pk})
+            with CaptureQueriesContext(connection) as context:
+                res = self.client.get(url)
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            self.assertEqual(len(res.data["flights"]), 1)
+            self.assertEqual(res.data["flights"][0]["id"], str(self.flight.pk))
+            return res, len(context.captured_queries)
+
+        Ticket.objects.create(flight=self.flight, row=1, seat=1, order=order, price=1)
+        res, single = count_detail_queries()
+        for seat in range(2, 11):
+            Ticket.objects.create(flight=self.flight, row=1, seat=seat, order=order, price=1)
+        res, many = count_detail_queries()
+        self.assertEqual(single, many)
+        self.assertEqual(len(res.data["tickets"]), 10)
+        self.assertEqual(res.data["tickets"][0]["flight"], self.flight.pk)
+
+    # Skip the pre-check to reach the seat map and unique constraint, as in a race.
+    @patch.object(OrderCreateSerializer, "validate_tickets", lambda self, tickets: tickets)
+    def test_order_seat_conflict(self):
+        order = Order.objects.create(user=self.user)
+        Ticket.objects.create(flight=self.flight, row=1, seat=1, order=order, price=1)
+        for stale_seat_map in (False, True):
+            if stale_seat_map:
+                SeatMap.objects.filter(flight=self.flight).update(taken=bytes(13))
+            payload = {
+                "tickets": [
+                    {"row": 1, "seat": 1, "flight": str(self.flight.pk)},
+                    {"row": 1, "seat": 2, "flight": str(self.flight.pk)},
+                ]
+            }
+            res = self.client.post(self.url, payload, content_type="application/json")
+            self.assertEqual(res.status_code, status.HTTP_409_CONFLICT)
+            self.assertEqual(
+                res.data["conflicts"], [{"flight": str(self.flight.pk), "row": 1, "seat": 1}]
+            )
+            self.assertEqual(Ticket.objects.count(), 1)
+            self.user.refresh_from_db()
+            self.assertEqual(self.user.balance, 500)
+
+    def test_deleted_tickets_free_their_seats(self):
+        payload = {"tickets": [{"row": 1, "seat": 1, "flight": str(self.flight.pk)}]}
+        with self.captureOnCommitCallbacks(execute=True):
+            res = self.client.post(self.url, payload, content_type="application/json")
+            self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+            res = self.client.delete(reverse("user:my-profile"))
+            self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertFalse(Ticket.objects.exists())
+        self.assertTrue(SeatMap.objects.get(flight=self.flight).is_free(1, 1))
+
+        self.client.force_authenticate(sample_user(email="other@test.com", balance=500))
+        res = self.client.post(self.url, payload, content_type="application/json")
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+
+    def test_stale_seat_bits_do_not_block_booking(self):
+        seat_map = SeatMap.objects.rebuild(self.flight)
+        seat_map.set_seats([(2, 2)], True)
+        seat_map.save()
+        payload = {"tickets": [{"row": 2, "seat": 2, "flight": str(self.flight.pk)}]}
+        res = self.client.post(self.url, payload, content_type="application/json")
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
 
     def test_order_duplicate_ticket(self):
         payload = {
@@ -399,6 +827,743 @@ class TestUserOrder(APITestCase):
         self.assertIn("Duplicate seat 1-1", res.content.decode())
 
 
+class TestFlightList(APITestCase):
+
+    def setUp(self):
+        self.user = sample_user(balance=500)
+        self.client.force_authenticate(self.user)
+        airplane_type = AirplaneType.objects.create(name="Airplane")
+        self.airplane = Airplane.objects.create(
+            type=airplane_type,
+            tail_number="123",
+            manufacturer="AIRBUS",
+            rows=2,
+            seats_in_row=2,
+        )
+        self.crew = [
+            Crew.objects.create(
+                first_name=role,
+                last_name=role,
+                role=role,
+                license_number=role,
+                license_expiration=now() + timedelta(days=30),
+            )
+            for role in ("PILOT", "CO-PILOT", "FLIGHT_ATTENDANT")
+        ]
+        airport1 = Airport.objects.create(
+            name="Boryspil International Airport",
+            IATA_code="KBP",
+            ICAO_code="UKBB",
+            closest_big_city="Kyiv",
+            timezone="Europe/Kyiv",
+            latitude=Decimal("50.345000"),
+            longitude=Decimal("30.894722"),
+        )
+        airport2 = Airport.objects.create(
+            name="Frankfurt am Main Airport",
+            IATA_code="FRA",
+            ICAO_code="EDDF",
+            closest_big_city="Frankfurt",
+            timezone="Europe/Berlin",
+            latitude=Decimal("50.033333"),
+            longitude=Decimal("8.570556"),
+        )
+        self.route = Route.objects.create(source=airport1, destination=airport2)
+        self.url = reverse("airport:flight-list")
+
+    def create_flight(self, departure_time, arrival_time, airplane=None):
+        flight = Flight.objects.create(
+            airplane=airplane or self.airplane,
+            route=self.route,
+            departure_time=departure_time,
+            arrival_time=arrival_time,
+        )
+        flight.crew.add(*self.crew)
+        return flight
+
+    def count_list_queries(self):
+        with CaptureQueriesContext(connection) as context:
+            res = self.client.get(self.url)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return len(context.captured_queries)
+
+    def test_query_count_does_not_grow(self):
+        self.create_flight(now() + timedelta(days=1), now() + timedelta(days=1, hours=2))
+        single = self.count_list_queries()
+        for day in range(2, 6):
+            self.create_flight(now() + timedelta(days=day), now() + timedelta(days=day, hours=2))
+        self.assertEqual(self.count_list_queries(), single)
+
+    def test_batch_localization(self):
+        start = datetime(2025, 1, 1, tzinfo=pytz.utc)
+        values = [
+            (start + timedelta(hours=hours, minutes=hours % 60), tz)
+            for hours in range(0, 24 * 400, 7)
+            for tz in ("Europe/Kyiv", "America/New_York", "Asia/Kathmandu", "UTC")
+        ]
+        self.assertEqual(
+            localize_many(values),
+            [localtime(value, timezone=pytz.timezone(tz)).isoformat() for value, tz in values],
+        )
+
+        for day in range(1, 4):
+            self.create_flight(now() + timedelta(days=day), now() + timedelta(days=day, hours=2))
+        flights = list(Flight.objects.all())
+        with self.assertNumQueries(1):
+            localize_flights(flights)
+        for flight in flights:
+            self.assertEqual(
+                flight.local_departure_time,
+                localtime(flight.departure_time, timezone=pytz.timezone("Europe/Kyiv")).isoformat(),
+            )
+            self.assertEqual(
+                flight.local_arrival_time,
+                localtime(flight.arrival_time, timezone=pytz.timezone("Europe/Berlin")).isoformat(),
+            )
+
+    def test_annotations_match_properties(self):
+        flights = [
+            self.create_flight(now() + timedelta(days=10), now() + timedelta(days=10, hours=2)),
+            self.create_flight(now() + timedelta(days=1), now() + timedelta(days=1, hours=2)),
+            self.create_flight(now() - timedelta(hours=1), now() + timedelta(hours=1)),
+            self.create_flight(now() - timedelta(days=1), now() - timedelta(hours=20)),
+        ]
+        order = Order.objects.create(user=self.user)
+        for row, seat in ((1, 1), (1, 2), (2, 1), (2, 2)):
+            Ticket.objects.create(
+                flight=flights[1], order=order, row=row, seat=seat, price=Decimal("1")
+            )
+        base = Decimal(self.route.distance) * Decimal("0.025")
+        expected = [
+            base,
+            base * Decimal("1.2") * Decimal("1.3"),
+            base * Decimal("1.2"),
+            Decimal(0),
+        ]
+        self.assertFalse(Flight.objects.with_price().filter(current_price__isnull=False).exists())
+        for flight, price in zip(flights, expected):
+            self.assertEqual(flight.price, price.quantize(Decimal("0.01")))
+
+        annotated = {
+            flight.pk: flight
+            for flight in Flight.objects.with_details().with_price().with_status()
+        }
+        for flight in flights:
+            self.assertEqual(annotated[flight.pk].status, flight.status)
+            self.assertEqual(annotated[flight.pk].current_price, flight.price)
+
+    def test_fare_invalidation(self):
+        flight = self.create_flight(now() + timedelta(days=10), now() + timedelta(days=10, hours=2))
+        base = flight.price
+        self.assertEqual(
+            Fare.objects.get(flight=flight).valid_until, flight.departure_time - timedelta(days=3)
+        )
+
+        high = (base * Decimal("1.3")).quantize(Decimal("0.01"))
+        order = Order.objects.create(user=self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            for row, seat in ((1, 1), (1, 2), (2, 1), (2, 2)):
+                Ticket.objects.create(flight=flight, order=order, row=row, seat=seat, price=base)
+        self.assertEqual(Flight.objects.get(pk=flight.pk).price, high)
+        with self.captureOnCommitCallbacks(execute=True):
+            Ticket.objects.get(flight=flight, row=2, seat=2).delete()
+        self.assertEqual(Flight.objects.get(pk=flight.pk).price, base)
+
+        res = self.client.post(
+            reverse("airport:order-list"),
+            {"tickets": [{"flight": flight.pk, "row": 2, "seat": 2}]},
+            format="json",
+        )
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Flight.objects.get(pk=flight.pk).price, high)
+        Order.objects.filter(pk=res.data["id"]).cancel()
+        self.assertEqual(Flight.objects.get(pk=flight.pk).price, base)
+
+        # A fare computed before the cancellation cannot replace the fresh one.
+        version = Fare.objects.get(flight=flight).version
+        Fare.objects.invalidate([flight])
+        stale = Fare.objects.refresh({flight.pk: version})
+        self.assertEqual(stale[flight.pk], base)
+        self.assertIsNone(Flight.objects.with_price().get(pk=flight.pk).current_price)
+        self.assertEqual(Flight.objects.get(pk=flight.pk).price, base)
+
+        Fare.objects.filter(flight=flight).update(valid_until=now() - timedelta(seconds=1))
+        self.assertIsNone(Flight.objects.with_price().get(pk=flight.pk).current_price)
+
+    def test_retrieve(self):
+        flight = self.create_flight(
+            now() + timedelta(days=1), now() + timedelta(days=1, hours=2)
+        )
+        url = reverse("airport:flight-detail", kwargs={"pk": flight.pk})
+        res = self.client.get(url)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data["crew"]), 3)
+        self.assertEqual(res.data["status"], "PLANNED")
+
+    def test_search_by_airports_and_status(self):
+        planned = self.create_flight(now() + timedelta(days=1), now() + timedelta(days=1, hours=2))
+        self.create_flight(now() - timedelta(days=1), now() - timedelta(hours=20))
+        res = self.client.get(self.url, {"source": "kbp", "destination": "FRA", "status": "planned"})
+        self.assertEqual([flight["id"] for flight in res.data["results"]], [str(planned.pk)])
+        res = self.client.get(self.url, {"source": "FRA"})
+        self.assertEqual(res.data["results"], [])
+
+    def test_search_by_departure_window(self):
+        departure = (now() + timedelta(days=5)).replace(hour=23, minute=30, second=0, microsecond=0)
+        flight = self.create_flight(departure, departure + timedelta(hours=2))
+        utc_day = departure.date().isoformat()
+        kyiv_day = (departure.date() + timedelta(days=1)).isoformat()
+
+        res = self.client.get(self.url, {"departure_from": utc_day, "departure_to": utc_day})
+        self.assertEqual([f["id"] for f in res.data["results"]], [str(flight.pk)])
+        res = self.client.get(self.url, {
+            "departure_from": kyiv_day, "departure_to": kyiv_day, "local_time": "true"
+        })
+        self.assertEqual([f["id"] for f in res.data["results"]], [str(flight.pk)])
+        res = self.client.get(self.url, {"departure_from": kyiv_day})
+        self.assertEqual(res.data["results"], [])
+
+    def test_keyset_pagination(self):
+        departure = now() + timedelta(days=2)
+        flights = [
+            self.create_flight(
+                departure + timedelta(hours=hour // 2),
+                departure + timedelta(days=1),
+                Airplane.objects.create(
+                    type=self.airplane.type, tail_number=str(hour), rows=2, seats_in_row=2
+                ),
+            )
+            for hour in range(5)
+        ]
+        expected = [
+            str(flight.pk) for flight in sorted(flights, key=lambda f: (f.departure_time, f.pk))
+        ]
+        seen, pages, url = [], [], self.url + "?page_size=2"
+        while url:
+            res = self.client.get(url)
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            pages.append(res.data)
+            seen += [flight["id"] for flight in res.data["results"]]
+            url = res.data["next"]
+        self.assertEqual(seen, expected)
+        self.assertIsNone(pages[0]["previous"])
+        res = self.client.get(pages[-1]["previous"])
+        self.assertEqual(res.data["results"], pages[-2]["results"])
+
+    def test_invalid_cursor(self):
+        for cursor in (
+            "broken",
+            {"p": "ab", "r": False},
+            {"p": ["yesterday", str(uuid.uuid4())], "r": False},
+            {"p": [now().isoformat(), "not-a-uuid"], "r": True},
+            {"p": [None, str(uuid.uuid4())], "r": False},
+            {"p": [[1], {"id": 1}], "r": False},
+        ):
+            if not isinstance(cursor, str):
+                cursor = base64.urlsafe_b64encode(json.dumps(cursor).encode()).decode()
+            res = self.client.get(self.url, {"cursor": cursor})
+            self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_search_invalid_date(self):
+        res = self.client.get(self.url, {"departure_from": "yesterday"})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class TestItinerarySearch(APITestCase):
+
+    def setUp(self):
+        self.user = sample_user()
+        self.client.force_authenticate(self.user)
+        self.airplane_type = AirplaneType.objects.create(name="Airplane")
+        self.kbp, self.fra, self.jfk = (
+            Airport.objects.create(
+                name=name,
+                IATA_code=iata,
+                ICAO_code=icao,
+                closest_big_city=name,
+                timezone=tz,
+                latitude=Decimal(latitude),
+                longitude=Decimal(longitude),
+            )
+            for name, iata, icao, tz, latitude, longitude in (
+                ("Boryspil", "KBP", "UKBB", "Europe/Kyiv", "50.345000", "30.894722"),
+                ("Frankfurt", "FRA", "EDDF", "Europe/Berlin", "50.033333", "8.570556"),
+                ("Kennedy", "JFK", "KJFK", "America/New_York", "40.639722", "-73.778889"),
+            )
+        )
+        kyiv = pytz.timezone("Europe/Kyiv")
+        self.day = (now().astimezone(kyiv) + timedelta(days=2)).date()
+        self.departure = kyiv.localize(datetime.combine(self.day, datetime.min.time())) + (
+            timedelta(hours=10)
+        )
+        self.url = reverse("airport:flight-itineraries")
+        graph.invalidate()
+
+    def create_flight(self, source, destination, departure_time, hours):
+        airplane = Airplane.objects.create(
+            type=self.airplane_type,
+            tail_number=str(Airplane.objects.count()),
+            rows=2,
+            seats_in_row=2,
+        )
+        return Flight.objects.create(
+            airplane=airplane,
+            route=Route.objects.get_or_create(source=source, destination=destination)[0],
+            departure_time=departure_time,
+            arrival_time=departure_time + timedelta(hours=hours),
+        )
+
+    def search(self, **params):
+        params = {"source": "KBP", "destination": "JFK", "date": self.day.isoformat(), **params}
+        res = self.client.get(self.url, params)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return [[flight["id"] for flight in itinerary["flights"]] for itinerary in res.data]
+
+    def test_itinerary_search(self):
+        first = self.create_flight(self.kbp, self.fra, self.departure, 3)
+        second = self.create_flight(self.fra, self.jfk, first.arrival_time + timedelta(hours=2), 8)
+        self.create_flight(self.fra, self.jfk, first.arrival_time + timedelta(minutes=20), 8)
+        direct = self.create_flight(self.kbp, self.jfk, self.departure + timedelta(hours=2), 11)
+
+        self.assertEqual(self.search(), [[str(direct.pk)], [str(first.pk), str(second.pk)]])
+        self.assertEqual(self.search(max_connections=0), [[str(direct.pk)]])
+        self.assertEqual(self.search(date=(self.day + timedelta(days=1)).isoformat()), [])
+
+        res = self.client.get(self.url, {"source": "KBP", "destination": "JFK", "order_by": "x"})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        res = self.client.get(self.url, {"source": "XXX", "destination": "JFK"})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_itinerary_graph_refresh(self):
+        first = self.create_flight(self.kbp, self.fra, self.departure, 3)
+        self.assertEqual(self.search(), [])
+
+        second = self.create_flight(self.fra, self.jfk, first.arrival_time + timedelta(hours=1), 8)
+        self.assertEqual(self.search(), [[str(first.pk), str(second.pk)]])
+        with self.assertNumQueries(0):
+            found = graph.search(self.kbp.pk, self.jfk.pk, self.departure, self.departure)
+        self.assertEqual([leg.flight for leg in found[0]], [first.pk, second.pk])
+
+        second.delete()
+        self.assertEqual(self.search(), [])
+
+
+class TestAirportNearest(APITestCase):
+
+    def setUp(self):
+        self.client.force_authenticate(sample_user())
+        self.airports = {
+            iata: Airport.objects.create(
+                name=city,
+                IATA_code=iata,
+                ICAO_code=icao,
+                closest_big_city=city,
+                latitude=Decimal(latitude),
+                longitude=Decimal(longitude),
+            )
+            for city, iata, icao, latitude, longitude in (
+                ("Kyiv", "KBP", "UKBB", "50.345000", "30.894722"),
+                ("Frankfurt", "FRA", "EDDF", "50.033333", "8.570556"),
+                ("Warsaw", "WAW", "EPWA", "52.165833", "20.967222"),
+                ("New York", "JFK", "KJFK", "40.639722", "-73.778889"),
+            )
+        }
+        self.url = reverse("airport:airport-nearest")
+
+    def nearest(self, **params):
+        res = self.client.get(self.url, params)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return [airport["IATA_code"] for airport in res.data]
+
+    def test_nearest_airports(self):
+        self.assertEqual(
+            self.nearest(latitude=50.45, longitude=30.52), ["KBP", "WAW", "FRA", "JFK"]
+        )
+        self.assertEqual(self.nearest(latitude=50.45, longitude=30.52, radius=1000), ["KBP", "WAW"])
+        self.assertEqual(self.nearest(city="frankfurt", limit=2), ["FRA", "WAW"])
+
+        res = self.client.get(self.url, {"latitude": 50.45, "longitude": 30.52, "limit": 1})
+        expected = self.airports["KBP"]
+        self.assertAlmostEqual(
+            res.data[0]["distance"],
+            Route().haversine_distance(50.45, 30.52, expected.latitude, expected.longitude),
+            delta=1,
+        )
+
+    def test_nearest_refreshes_on_change(self):
+        self.assertEqual(self.nearest(latitude=49.81, longitude=24.02, limit=1), ["WAW"])
+        Airport.objects.create(
+            name="Lviv",
+            IATA_code="LWO",
+            ICAO_code="UKLL",
+            closest_big_city="Lviv",
+            latitude=Decimal("49.812500"),
+            longitude=Decimal("23.956111"),
+        )
+        self.assertEqual(self.nearest(latitude=49.81, longitude=24.02, limit=1), ["LWO"])
+
+        # Writes from another process reach no signal here.
+        Airport.objects.filter(IATA_code="LWO").update(
+            latitude=Decimal("-33.946111"), longitude=Decimal("151.177222"), updated_at=now()
+        )
+        self.assertEqual(self.nearest(latitude=49.81, longitude=24.02, limit=1), ["WAW"])
+
+    def test_nearest_invalid_params(self):
+        for params in (
+            {"latitude": 91, "longitude": 0},
+            {"latitude": "north", "longitude": 0},
+            {"latitude": 0, "longitude": 0, "radius": -1},
+            {"city": "Atlantis"},
+        ):
+            res = self.client.get(self.url, params)
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class TestConditionalGet(APITestCase):
+
+    def setUp(self):
+        self.client.force_authenticate(sample_user())
+        self.source, self.destination = (
+            Airport.objects.create(
+                name=city,
+                IATA_code=iata,
+                ICAO_code=icao,
+                closest_big_city=city,
+                latitude=Decimal(latitude),
+                longitude=Decimal(longitude),
+            )
+            for city, iata, icao, latitude, longitude in (
+                ("Kyiv", "KBP", "UKBB", "50.345000", "30.894722"),
+                ("Frankfurt", "FRA", "EDDF", "50.033333", "8.570556"),
+            )
+        )
+        self.route = Route.objects.create(source=self.source, destination=self.destination)
+
+    def get(self, url, etag=None):
+        headers = {"If-None-Match": etag} if etag else {}
+        return self.client.get(url, headers=headers)
+
+    def test_list_not_modified(self):
+        url = reverse("airport:route-list")
+        res = self.get(url)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        etag = res["ETag"]
+        self.assertIn("Last-Modified", res)
+
+        with self.assertNumQueries(0):
+            res = self.get(url, etag)
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(res.content, b"")
+        res = self.client.get(url, headers={"If-Modified-Since": res["Last-Modified"]})
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        self.assertEqual(self.get(url + "?page=2", etag).status_code, status.HTTP_200_OK)
+        self.destination.name = "Frankfurt am Main"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.destination.save()
+        res = self.get(url, etag)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        etag = res["ETag"]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Airport.objects.filter(pk=self.route.source_id).delete()
+        self.assertEqual(self.get(url, etag).status_code, status.HTTP_200_OK)
+
+    def test_current_time_is_never_not_modified(self):
+        for url in (
+            reverse("airport:airport-list"),
+            reverse("airport:airport-detail", kwargs={"pk": self.source.pk}),
+            reverse("airport:route-detail", kwargs={"pk": self.route.pk}),
+        ):
+            res = self.get(url)
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            self.assertNotIn("ETag", res)
+            self.assertNotIn("Last-Modified", res)
+
+    def test_related_changes_touch_rows(self):
+        url = reverse("airport:route-list")
+        etag = self.get(url)["ETag"]
+        self.assertEqual(self.get(url, etag).status_code, status.HTTP_304_NOT_MODIFIED)
+        self.source.name = "Boryspil"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.source.save()
+        self.assertEqual(self.get(url, etag).status_code, status.HTTP_200_OK)
+
+        airplane_type = AirplaneType.objects.create(name="Airplane")
+        Airplane.objects.create(type=airplane_type, tail_number="1", rows=1, seats_in_row=1)
+        url = reverse("airport:airplane-list")
+        etag = self.get(url)["ETag"]
+        airplane_type.name = "Jet"
+        with self.captureOnCommitCallbacks(execute=True):
+            airplane_type.save()
+        res = self.get(url, etag)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data[0]["type_name"], "Jet")
+
+        url = reverse("airport:airplane-detail", kwargs={"pk": "not-a-uuid"})
+        self.assertEqual(self.get(url).status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_license_expiring_modifies_crew(self):
+        expiration = now() + timedelta(days=1)
+        crew = Crew.objects.create(
+            first_name="Ivan",
+            last_name="Ivanov",
+            role="PILOT",
+            license_number="LIC001",
+            license_expiration=expiration,
+        )
+        for url in (
+            reverse("airport:crew-list"),
+            reverse("airport:crew-detail", kwargs={"pk": crew.pk}),
+        ):
+            etag = self.get(url)["ETag"]
+            self.assertEqual(self.get(url, etag).status_code, status.HTTP_304_NOT_MODIFIED)
+            later = expiration + timedelta(minutes=1)
+            with patch("airport.views.now", return_value=later), patch(
+                "airport.models.now", return_value=later
+            ):
+                res = self.get(url, etag)
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            self.assertNotEqual(res["ETag"], etag)
+
+
+class TestResponseCache(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_authenticate(sample_user())
+        self.airport, destination = (
+            Airport.objects.create(
+                name=city,
+                IATA_code=iata,
+                ICAO_code=icao,
+                closest_big_city=city,
+                latitude=Decimal(latitude),
+                longitude=Decimal(longitude),
+            )
+            for city, iata, icao, latitude, longitude in (
+                ("Kyiv", "KBP", "UKBB", "50.345000", "30.894722"),
+                ("Frankfurt", "FRA", "EDDF", "50.033333", "8.570556"),
+            )
+        )
+        Route.objects.create(source=self.airport, destination=destination)
+
+    def test_reads_are_cached_until_models_change(self):
+        url = reverse("airport:route-list")
+        etag = self.client.get(url)["ETag"]
+        with self.assertNumQueries(0):
+            res = self.client.get(url)
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            self.assertEqual(res["ETag"], etag)
+            self.assertEqual(res.data[0]["source_name"], "Kyiv")
+            res = self.client.get(url, headers={"If-None-Match": etag})
+            self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        with self.assertNumQueries(6):
+            self.client.get(url + "?source=Kyiv")
+            with translation.override("ua"):
+                self.client.get(url)
+
+        self.airport.name = "Boryspil"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.airport.save()
+            self.assertEqual(self.client.get(url).data[0]["source_name"], "Kyiv")
+        self.assertEqual(self.client.get(url).data[0]["source_name"], "Boryspil")
+
+        airplane_type = AirplaneType.objects.create(name="Airplane")
+        url = reverse("airport:airplane-type-detail", kwargs={"pk": airplane_type.pk})
+        self.client.get(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            airplane_type.delete()
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_current_time_is_not_cached(self):
+        url = reverse("airport:airport-list")
+        self.client.get(url)
+        with self.assertNumQueries(1):
+            res = self.client.get(url)
+        self.assertIn("current_time", res.data[0])
+
+    def test_stampede_protection(self):
+        calls = []
+
+        def build():
+            calls.append(None)
+            return len(calls), True
+
+        key = caching.make_key("stampede")
+        self.assertEqual(caching.get_or_build(key, build), 1)
+        self.assertEqual(caching.get_or_build(key, build), 1)
+
+        cache.set(key, (time.time() - 1, "stale"))
+        cache.add(f"{key}:lock", 1)
+        self.assertEqual(caching.get_or_build(key, build), "stale")
+        cache.delete(f"{key}:lock")
+        self.assertEqual(caching.get_or_build(key, build), 2)
+
+        caching.invalidate()
+        self.assertNotEqual(caching.make_key("stampede"), key)
+        self.assertEqual(caching.get_or_build(caching.make_key("stampede"), build), 3)
+        self.assertEqual(len(calls), 3)
+
+
+class TestExport(APITestCase):
+
+    def setUp(self):
+        self.admin = sample_user(email="admin@test.com", is_staff=True)
+        self.client.force_authenticate(self.admin)
+        airports = [
+            Airport.objects.create(
+                name=code, IATA_code=code, ICAO_code=code, closest_big_city=code,
+                latitude=Decimal(latitude), longitude=Decimal(longitude),
+            )
+            for code, latitude, longitude in (("KBP", "50.345", "30.894"), ("FRA", "50.033", "8.570"))
+        ]
+        route = Route.objects.create(source=airports[0], destination=airports[1])
+        airplane = Airplane.objects.create(
+            type=AirplaneType.objects.create(name="Jet"), tail_number="UR-1", rows=5, seats_in_row=4
+        )
+        start = datetime(2030, 1, 1, tzinfo=pytz.utc)
+        self.flights = [
+            Flight.objects.create(
+                airplane=airplane,
+                route=route,
+                departure_time=start + timedelta(days=day),
+                arrival_time=start + timedelta(days=day, hours=2),
+            )
+            for day in range(5)
+        ]
+        for position, order_status in enumerate(("PAID", "CANCELLED", "PAID")):
+            order = Order.objects.create(user=self.admin, status=order_status, total_price=10)
+            Ticket.objects.create(
+                flight=self.flights[0], order=order, row=1, seat=position + 1, price=10
+            )
+
+    def export(self, name, **params):
+        return self.client.get(reverse("airport:export", kwargs={"name": name}), params)
+
+    def test_ndjson_streams_in_chunks(self):
+        with patch("airport.exports.CHUNK_SIZE", 2):
+            res = self.export("flights", **{"from": "2030-01-02", "to": "2030-01-04"})
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            self.assertTrue(res.streaming)
+            self.assertEqual(res["Content-Type"], "application/x-ndjson")
+            chunks = [chunk.decode() for chunk in res.streaming_content]
+        self.assertEqual(len(chunks), 2)
+        rows = [json.loads(line) for line in "".join(chunks).splitlines()]
+        self.assertEqual([row["id"] for row in rows], [str(f.pk) for f in self.flights[1:4]])
+        self.assertEqual(rows[0]["source"], "KBP")
+        self.assertEqual(rows[0]["departure_time"], "2030-01-02T00:00:00Z")
+
+    def test_csv_with_status_filter(self):
+        res = self.export("orders", file_format="csv", status="paid")
+        lines = b"".join(res.streaming_content).decode().splitlines()
+        self.assertEqual(res["Content-Disposition"], 'attachment; filename="orders.csv"')
+        self.assertEqual(lines[0], "id,user,email,status,total_price,created_at")
+        self.assertEqual(len(lines), 3)
+        self.assertTrue(all(",PAID,10.00," in line for line in lines[1:]))
+
+        res = self.export("tickets", file_format="csv", status="cancelled")
+        self.assertEqual(len(b"".join(res.streaming_content).decode().splitlines()), 2)
+
+    def test_command_and_validation(self):
+        out = StringIO()
+        call_command("export", "flights", "--from", "2030-01-05", stdout=out)
+        self.assertEqual(len(out.getvalue().splitlines()), 1)
+        with self.assertRaises(CommandError):
+            call_command("export", "flights", "--to", "soon", stdout=out)
+
+        self.assertEqual(self.export("users").status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(
+            self.export("flights", file_format="xml").status_code, status.HTTP_400_BAD_REQUEST
+        )
+        self.assertEqual(self.export("flights", to="soon").status_code, status.HTTP_400_BAD_REQUEST)
+        self.client.force_authenticate(sample_user())
+        self.assertEqual(self.export("transactions").status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_parse_bound(self):
+        self.assertIsNone(exports.parse_bound(""))
+        self.assertEqual(
+            exports.parse_bound("2030-01-05", end=True, tz=pytz.utc),
+            datetime(2030, 1, 6, tzinfo=pytz.utc),
+        )
+        self.assertEqual(exports.parse_bound("2030-01-05T10:00"), datetime(2030, 1, 5, 10))
+        self.assertEqual(
+            exports.parse_bound("2030-01-05T10:00+02:00", tz=pytz.utc).utcoffset(),
+            timedelta(hours=2),
+        )
+        for value in ("soon", "2030-13-01"):
+            with self.assertRaises(ValueError):
+                exports.parse_bound(value)
+
+
+class TestBulkLoad(TestCase):
+
+    def test_load_data_yaml(self):
+        with open("data.yaml", encoding="utf-16") as fixture:
+            objects = json.load(fixture)
+        out = StringIO()
+        call_command("bulkload", "data.yaml", "--batch-size", "4", stdout=out)
+
+        self.assertIn("(utf-16)", out.getvalue())
+        self.assertIn("rows/s", out.getvalue())
+        for model in (Airport, Route, Flight, Order, Ticket, USER_MODEL):
+            self.assertEqual(
+                model.objects.count(),
+                sum(obj["model"] == model._meta.label_lower for obj in objects),
+            )
+        route = next(obj for obj in objects if obj["model"] == "airport.route")
+        stops = Route.objects.get(pk=route["pk"]).stops.values_list("pk", flat=True)
+        self.assertEqual({str(pk) for pk in stops}, set(route["fields"]["stops"]))
+        totals = {obj["pk"]: Decimal(0) for obj in objects if obj["model"] == "airport.order"}
+        for obj in objects:
+            if obj["model"] == "airport.ticket":
+                totals[obj["fields"]["order"]] += Decimal(obj["fields"]["price"])
+        self.assertTrue(all(totals.values()))
+        self.assertEqual(
+            {str(pk): total for pk, total in Order.objects.values_list("pk", "total_price")},
+            totals,
+        )
+        user = next(obj for obj in objects if obj["model"] == "user.user")
+        self.assertEqual(
+            USER_MODEL.objects.get(pk=user["pk"]).password, user["fields"]["password"]
+        )
+
+    def test_encodings_and_streaming(self):
+        document = '[{"model": "airport.airplanetype", "pk": "%s", "fields": {"name": "Jet \\t"}}]'
+        for encoding, detected in (
+            ("utf-8", "utf-8"),
+            ("utf-8-sig", "utf-8-sig"),
+            ("utf-16", "utf-16"),
+            ("utf-16-be", "utf-16-be"),
+            ("utf-16-le", "utf-16-le"),
+            ("utf-32", "utf-32"),
+            ("utf-32-be", "utf-32-be"),
+        ):
+            self.assertEqual(fixtures.detect_encoding(document.encode(encoding)[:4]), detected)
+
+        with patch("airport.fixtures.READ_SIZE", 3):
+            self.assertEqual(
+                list(fixtures.iter_objects(StringIO(' [ {"a": "]"} ,\n {"b": [2]} ] '))),
+                [{"a": "]"}, {"b": [2]}],
+            )
+            self.assertEqual(list(fixtures.iter_objects(StringIO("[]"))), [])
+
+        with tempfile.NamedTemporaryFile("w", encoding="utf-16-be", suffix=".json") as fixture:
+            fixture.write(document % "1e188306-0a4d-48f5-9240-0a60fbad5563")
+            fixture.flush()
+            call_command("bulkload", fixture.name, stdout=StringIO())
+        self.assertEqual(AirplaneType.objects.get().name, "Jet \t")
+
+    def test_invalid_fixture_saves_nothing(self):
+        with tempfile.NamedTemporaryFile("w", suffix=".json") as fixture:
+            fixture.write('[{"model": "airport.airplanetype", "fields": {"name": "Jet"}}, {]')
+            fixture.flush()
+            with self.assertRaises(CommandError):
+                call_command("bulkload", fixture.name, "--batch-size", "1", stdout=StringIO())
+        self.assertFalse(AirplaneType.objects.exists())
+
+
 @override_settings(MEDIA_ROOT=MEDIA_ROOT)
 class AirplaneImageTest(APITestCase):
 
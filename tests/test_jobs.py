@@ -0,0 +1,180 @@
+import socketserver
+import threading
+from datetime import timedelta
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils.timezone import now
+
+from jobs import queue, tasks
+from jobs.models import Job
+
+calls = []
+
+
+@queue.task(max_attempts=2)
+def record(value):
+    calls.append(value)
+
+
+@queue.task(max_attempts=2)
+def fail():
+    raise ConnectionError("SMTP is down")
+
+
+@queue.task(max_attempts=2)
+def crash():
+    # Stands in for a worker killed mid-task: not caught like an exception.
+    raise SystemExit(1)
+
+
+class TestQueue(TestCase):
+
+    def setUp(self):
+        calls.clear()
+
+    def test_jobs_run_in_order_once(self):
+        later = record.enqueue(delay=timedelta(hours=1), value="later")
+        record.enqueue(value=1)
+        record.enqueue(value=2)
+
+        self.assertEqual(queue.run_pending(), 2)
+        self.assertEqual(calls, [1, 2])
+        self.assertEqual(Job.objects.filter(status="DONE").count(), 2)
+        later.refresh_from_db()
+        self.assertEqual(later.status, "PENDING")
+        self.assertEqual(queue.run_pending(), 0)
+
+    def test_retries_with_backoff(self):
+        job = fail.enqueue()
+        self.assertEqual([ran.pk for ran in queue.run_next()], [job.pk])
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ("PENDING", 1))
+        self.assertIn("SMTP is down", job.last_error)
+        self.assertGreater(job.run_at, now() + queue.BACKOFF_BASE - timedelta(seconds=1))
+        self.assertEqual(queue.run_next(), [])
+
+        Job.objects.filter(pk=job.pk).update(run_at=now())
+        queue.run_next()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ("FAILED", 2))
+        self.assertEqual(queue.backoff(20), queue.BACKOFF_MAX)
+
+    def test_crashed_attempts_count(self):
+        job = crash.enqueue()
+        with self.assertRaises(SystemExit):
+            queue.run_next()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ("PENDING", 1))
+        self.assertGreater(job.run_at, now())
+        self.assertEqual(queue.run_next(), [])
+
+        Job.objects.filter(pk=job.pk).update(run_at=now())
+        with self.assertRaises(SystemExit):
+            queue.run_next()
+        Job.objects.filter(pk=job.pk).update(run_at=now())
+        self.assertEqual([ran.status for ran in queue.run_next()], ["FAILED"])
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ("FAILED", 2))
+        self.assertIn("last attempt", job.last_error)
+
+
+@queue.task(batch_size=3)
+def record_batch(batch):
+    calls.append([kwargs["value"] for kwargs in batch])
+    return [ValueError() if kwargs["value"] < 0 else None for kwargs in batch]
+
+
+class SMTPHandler(socketserver.StreamRequestHandler):
+    """Just enough SMTP to accept messages, recording them per connection."""
+
+    def reply(self, line):
+        self.wfile.write(f"{line}\r\n".encode())
+
+    def handle(self):
+        messages = []
+        self.server.connections.append(messages)
+        self.reply("220 localhost")
+        while line := self.rfile.readline():
+            command = line.decode().strip().upper()
+            if command.startswith("EHLO"):
+                self.reply("250 localhost")
+            elif command.startswith("RCPT") and "REJECT" in command:
+                self.reply("550 No such user")
+            elif command == "DATA":
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                data = b"".join(iter(self.rfile.readline, b".\r\n"))
+                messages.append(data.decode())
+                self.reply("250 OK")
+            elif command == "QUIT":
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("250 OK")
+
+
+class TestEmailDispatch(TestCase):
+
+    def setUp(self):
+        self.server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), SMTPHandler)
+        self.server.connections = []
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+    def test_batch_shares_one_connection(self):
+        for position in range(5):
+            tasks.send_email.enqueue(
+                subject=f"Notice {position}", message="Schedule changed", recipient_list=["a@a.com"]
+            )
+        rejected = tasks.send_email.enqueue(
+            subject="Rejected", message="Nobody", recipient_list=["reject@a.com"]
+        )
+        with override_settings(
+            EMAIL_BACKEND="django.core.mail.backends.smtp.EmailBackend",
+            EMAIL_HOST="127.0.0.1",
+            EMAIL_PORT=self.server.server_address[1],
+            EMAIL_USE_TLS=False,
+            EMAIL_HOST_USER="",
+            EMAIL_HOST_PASSWORD="",
+        ):
+            self.assertEqual(queue.run_pending(), 6)
+
+        self.assertEqual(len(self.server.connections), 1)
+        self.assertEqual(len(self.server.connections[0]), 5)
+        self.assertIn("Subject: Notice 4", self.server.connections[0][4])
+        self.assertEqual(Job.objects.filter(status="DONE").count(), 5)
+        rejected.refresh_from_db()
+        self.assertEqual((rejected.status, rejected.attempts), ("PENDING", 1))
+
+        stats = queue.stats(timedelta(minutes=5))
+        self.assertEqual(
+            [(row["task"], row["pending"], row["due"], row["done"]) for row in stats],
+            [(tasks.send_email.name, 1, 0, 5)],
+        )
+
+    def test_batches_are_capped(self):
+        for value in (1, -1, 2, 3):
+            record_batch.enqueue(value=value)
+        record.enqueue(value="single")
+        calls.clear()
+
+        self.assertEqual(queue.run_pending(), 5)
+        self.assertEqual(calls, [[1, -1, 2], [3], "single"])
+        self.assertEqual(Job.objects.filter(status="PENDING").count(), 1)
+
+
+class TestWorker(TransactionTestCase):
+
+    def setUp(self):
+        calls.clear()
+
+    def test_concurrent_workers_skip_locked_jobs(self):
+        for value in range(20):
+            record.enqueue(value=value)
+
+        call_command("run_worker", concurrency=4, once=True, stdout=StringIO())
+
+        self.assertEqual(sorted(calls), list(range(20)))
+        self.assertEqual(Job.objects.filter(status="DONE", attempts=1).count(), 20)
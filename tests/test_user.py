@@ -1,3 +1,7 @@
+import hashlib
+import hmac
+import json
+import time
 import uuid
 from decimal import Decimal
 from unittest.mock import patch
@@ -10,11 +14,14 @@ from rest_framework.reverse import reverse
 from rest_framework.test import APITestCase
 
 from airport_api import settings
-from user.models import Transaction
+from jobs import queue
+from user import wallet
+from user.models import StripeEvent, Transaction
 
 EMAIL = "test@test.com"
 PASSWORD = "test_password"
 USER_MODEL = get_user_model()
+WEBHOOK_SECRET = "whsec_test"
 
 
 def sample_user(email=EMAIL, password=PASSWORD, is_staff=False, is_superuser=False, balance=0):
@@ -44,6 +51,8 @@ class TestUnauthenticatedUser(APITestCase):
         )
         self.assertEqual(res.status_code, status.HTTP_201_CREATED)
         self.assertEqual(USER_MODEL.objects.count(), 1)
+        self.assertEqual(len(mail.outbox), 0)
+        queue.run_pending()
         if settings.USE_EMAIL_VERIFICATION:
             self.assertEqual(len(mail.outbox), 1)
             email = mail.outbox[0]
@@ -132,6 +141,20 @@ class TestAuthenticatedUser(APITestCase):
         self.assertContains(res, EMAIL)
         self.assertNotContains(res, PASSWORD)
 
+    def test_my_transactions(self):
+        for amount in range(3):
+            Transaction.objects.create(
+                user=self.user, amount=amount, email=self.user.email, status="SUCCESS"
+            )
+        Transaction.objects.create(amount=10, email="other@test.com", status="SUCCESS")
+        url = reverse("user:my-transactions")
+        res = self.client.get(url, {"page_size": 2})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data["results"]), 2)
+        res = self.client.get(res.data["next"])
+        self.assertEqual(len(res.data["results"]), 1)
+        self.assertIsNone(res.data["next"])
+
     def test_deposit(self):
         url = reverse("user:stripe-deposit")
         payload = {
@@ -144,28 +167,29 @@ class TestAuthenticatedUser(APITestCase):
         self.assertEqual(res.status_code, status.HTTP_200_OK)
         self.assertContains(res, "url")
 
-    @patch("stripe.Webhook.construct_event")
-    def test_stripe_webhook_checkout_session_completed(self, mock_construct_event):
-        url = reverse("user:stripe-webhook")  # Убедись, что это правильное имя URL
-
-        stripe_event = {
-            "type": "checkout.session.completed",
-            "data": {
-                "object": {
-                    "amount_total": 5500,
-                    "customer_details": {"email": self.user.email},
-                    "metadata": {"user_id": str(self.user.id)},
-                }
-            }
-        }
-        mock_construct_event.return_value = stripe_event
-
-        response = self.client.post(
-            url,
-            data=stripe_event,
-            format="json",
-            HTTP_STRIPE_SIGNATURE="fake-signature"
+    def post_event(self, event_type, session, event_id="evt_test"):
+        payload = json.dumps(
+            {"id": event_id, "object": "event", "type": event_type, "data": {"object": session}}
         )
+        timestamp = int(time.time())
+        signature = hmac.new(
+            WEBHOOK_SECRET.encode(), f"{timestamp}.{payload}".encode(), hashlib.sha256
+        ).hexdigest()
+        with patch("user.views.endpoint_secret", WEBHOOK_SECRET):
+            return self.client.post(
+                reverse("user:stripe-webhook"),
+                data=payload,
+                content_type="application/json",
+                HTTP_STRIPE_SIGNATURE=f"t={timestamp},v1={signature}",
+            )
+
+    def test_stripe_webhook_checkout_session_completed(self):
+        session = {
+            "amount_total": 5500,
+            "customer_details": {"email": self.user.email},
+            "metadata": {"user_id": str(self.user.id)},
+        }
+        response = self.post_event("checkout.session.completed", session)
 
         self.assertEqual(response.status_code, status.HTTP_200_OK)
 
@@ -176,32 +200,17 @@ class TestAuthenticatedUser(APITestCase):
         self.assertEqual(transaction.amount, Decimal("55.00"))
         self.assertEqual(transaction.status, "SUCCESS")
         self.assertEqual(transaction.email, self.user.email)
-
-    @patch("stripe.Webhook.construct_event")
-    def test_stripe_webhook_async_payment_failed(self, mock_construct_event):
-        url = reverse("user:stripe-webhook")
-
-        stripe_event = {
-            "type": "checkout.session.async_payment_failed",
-            "data": {
-                "object": {
-                    "customer_details": {"email": self.user.email},
-                    "metadata": {
-                        "user_id": str(self.user.id),
-                        "amount": "4200"
-                    }
-                }
+        self.assertTrue(StripeEvent.objects.filter(pk="evt_test").exists())
+
+    def test_stripe_webhook_async_payment_failed(self):
+        session = {
+            "customer_details": {"email": self.user.email},
+            "metadata": {
+                "user_id": str(self.user.id),
+                "amount": "4200"
             }
         }
-
-        mock_construct_event.return_value = stripe_event
-
-        response = self.client.post(
-            url,
-            data=stripe_event,
-            format="json",
-            HTTP_STRIPE_SIGNATURE="fake-signature"
-        )
+        response = self.post_event("checkout.session.async_payment_failed", session)
 
         self.assertEqual(response.status_code, status.HTTP_200_OK)
 
@@ -209,6 +218,65 @@ class TestAuthenticatedUser(APITestCase):
         self.assertEqual(transaction.amount, Decimal("42.00"))
         self.assertEqual(transaction.status, "FAILED")
         self.assertEqual(transaction.email, self.user.email)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.balance, Decimal("0.00"))
+
+    def test_stripe_webhook_is_idempotent(self):
+        session = {
+            "amount_total": 1000,
+            "customer_details": {"email": self.user.email},
+            "metadata": {"user_id": str(self.user.id)},
+        }
+        for _ in range(3):
+            response = self.post_event("checkout.session.completed", session)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.post_event("checkout.session.completed", session, event_id="evt_other")
+
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.balance, Decimal("20.00"))
+        self.assertEqual(Transaction.objects.filter(user=self.user).count(), 2)
+
+        with self.assertNumQueries(3):
+            self.post_event("checkout.session.completed", session)
+
+    def test_stripe_webhook_rejects_bad_signature_and_unknown_user(self):
+        response = self.client.post(
+            reverse("user:stripe-webhook"),
+            data="{}",
+            content_type="application/json",
+            HTTP_STRIPE_SIGNATURE="t=1,v1=fake-signature",
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        session = {"amount_total": 1000, "metadata": {"user_id": str(uuid.uuid4())}}
+        response = self.post_event("checkout.session.completed", session, event_id="evt_lost")
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertFalse(StripeEvent.objects.filter(pk="evt_lost").exists())
+
+
+class TestWallet(APITestCase):
+
+    def setUp(self):
+        self.user = sample_user(balance=100)
+
+    def test_debit_and_credit(self):
+        self.assertEqual(wallet.debit(self.user.pk, Decimal("40.50")), Decimal("59.50"))
+        self.assertEqual(wallet.credit(self.user.pk, Decimal("0.50")), Decimal("60.00"))
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.balance, Decimal("60.00"))
+
+    def test_debit_insufficient_funds(self):
+        with self.assertRaises(wallet.InsufficientFunds) as context:
+            wallet.debit(self.user.pk, Decimal("100.01"))
+        self.assertEqual(context.exception.balance, Decimal("100.00"))
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.balance, Decimal("100.00"))
+
+    def test_unknown_user(self):
+        with self.assertRaises(USER_MODEL.DoesNotExist):
+            wallet.credit(uuid.uuid4(), Decimal("1"))
+        with self.assertRaises(USER_MODEL.DoesNotExist):
+            wallet.debit("not-a-uuid", Decimal("1"))
 
 
 class ActivateAccountTestCase(APITestCase):
@@ -61,6 +61,11 @@ class User(AbstractUser):
 
     objects = UserManager()
 
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            models.Index(fields=["date_joined", "id"], name="user_date_joined_id_idx"),
+        ]
+
     def __str__(self):
         return self.email
 
@@ -84,6 +89,24 @@ class Transaction(models.Model):
         ordering = ["-date"]
         verbose_name_plural = _("Transactions")
         verbose_name = _("Transaction")
+        indexes = [
+            models.Index(fields=["user", "date", "id"], name="transaction_user_date_idx"),
+        ]
 
     def __str__(self):
         return f"{self.amount} {self.status}"
+
+
+class StripeEvent(models.Model):
+    """Ledger of processed Stripe webhook events, so redeliveries are ignored."""
+
+    id = models.CharField(max_length=255, primary_key=True)
+    type = models.CharField(max_length=255)
+    processed_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name_plural = _("Stripe events")
+        verbose_name = _("Stripe event")
+
+    def __str__(self):
+        return f"{self.type} {self.id}"
@@ -4,7 +4,7 @@ from rest_framework import serializers
 from rest_framework.exceptions import ValidationError
 
 from airport_api import settings
-from user.models import User
+from user.models import User, Transaction
 
 
 class EmptySerializer(serializers.Serializer):
@@ -71,3 +71,15 @@ class SetNewPasswordSerializer(serializers.Serializer):
                 "style": {"input_type": "password"},
             }
         }
+
+
+class TransactionSerializer(serializers.ModelSerializer):
+
+    class Meta:
+        model = Transaction
+        fields = (
+            "id",
+            "amount",
+            "date",
+            "status",
+        )
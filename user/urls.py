@@ -11,6 +11,7 @@ from user.views import (
     UserRegister,
     UserViewSet,
     MyProfileView,
+    MyTransactionsView,
     UserDeposit,
     StripeWebhookView,
     ActivateAccountView,
@@ -28,6 +29,7 @@ urlpatterns = [
     path("token/verify/", TokenVerifyView.as_view(), name="token_verify"),
     path("register/", UserRegister.as_view(), name="register"),
     path("me/", MyProfileView.as_view(), name="my-profile"),
+    path("me/transactions/", MyTransactionsView.as_view(), name="my-transactions"),
     path("deposit/", UserDeposit.as_view(), name="stripe-deposit"),
     path("deposit/webhook/", StripeWebhookView.as_view(), name="stripe-webhook"),
     path("", include(router.urls)),
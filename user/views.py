@@ -4,8 +4,6 @@ from decimal import Decimal, ROUND_DOWN, InvalidOperation
 
 from django.contrib.auth import get_user_model
 from django.contrib.auth.tokens import default_token_generator
-from django.core.mail import send_mail
-from django.db import transaction
 from django.utils.translation import gettext as _
 from drf_spectacular.utils import extend_schema
 from rest_framework import generics, permissions, viewsets, status
@@ -19,13 +17,17 @@ from rest_framework.views import APIView
 import stripe
 
 from airport_api import settings
+from airport_api.pagination import UserPagination, TransactionPagination
+from jobs import tasks
+from user import wallet
 from user.models import User, Transaction
 from user.permissions import IsAdmin
 from user.serializers import (
     UserSerializer,
     RequestPasswordResetSerializer,
     SetNewPasswordSerializer,
-    EmptySerializer
+    EmptySerializer,
+    TransactionSerializer,
 )
 
 stripe.api_key = settings.STRIPE_API_KEY
@@ -38,6 +40,7 @@ class UserViewSet(viewsets.ModelViewSet):
     queryset = User.objects.all()
     serializer_class = UserSerializer
     permission_classes = (IsAdmin,)
+    pagination_class = UserPagination
 
 
 @extend_schema(tags=["Me"])
@@ -51,11 +54,10 @@ class UserRegister(generics.CreateAPIView):
         uid = str(user.id)
         token = default_token_generator.make_token(user)
         link = f"{settings.FRONTEND_URL}/email-activate/{uid}/{token}/"
-        send_mail(
-            "Activate your account",
-            f"Please activate your account: {link}",
-            settings.DEFAULT_FROM_EMAIL,
-            [user.email]
+        tasks.send_email.enqueue(
+            subject="Activate your account",
+            message=f"Please activate your account: {link}",
+            recipient_list=[user.email],
         )
 
 
@@ -94,11 +96,10 @@ class PasswordResetView(generics.GenericAPIView):
             uid = str(user.id)
             token = default_token_generator.make_token(user)
             link = f"{settings.FRONTEND_URL}/reset-password-confirm/{uid}/{token}/"
-            send_mail(
-                "Reset your password",
-                f"Use this link to reset your password: {link}",
-                settings.DEFAULT_FROM_EMAIL,
-                [email]
+            tasks.send_email.enqueue(
+                subject="Reset your password",
+                message=f"Use this link to reset your password: {link}",
+                recipient_list=[email],
             )
         return Response({"detail": _("The reset link has been sent.")}, status=status.HTTP_200_OK)
 
@@ -159,9 +160,28 @@ class MyProfileView(RetrieveAPIView, UpdateAPIView, DestroyAPIView):
         return self.request.user
 
 
+@extend_schema(tags=["Me"])
+class MyTransactionsView(generics.ListAPIView):
+    serializer_class = TransactionSerializer
+    permission_classes = (permissions.IsAuthenticated,)
+    pagination_class = TransactionPagination
+
+    def get_queryset(self):
+        return Transaction.objects.filter(user=self.request.user)
+
+
 @extend_schema(tags=["Me"])
 class StripeWebhookView(APIView):
+    """
+    Each event is recorded in the StripeEvent ledger together with its effect,
+    so deliveries Stripe retries are acknowledged without crediting twice.
+    """
+
     authentication_classes = (permissions.AllowAny,)
+    handlers = {
+        "checkout.session.completed": wallet.deposit,
+        "checkout.session.async_payment_failed": wallet.record_failed_deposit,
+    }
 
     def post(self, request, *args, **kwargs):
         payload = request.body
@@ -175,59 +195,33 @@ class StripeWebhookView(APIView):
             logger.warning(f"Stripe event not found: {e}")
             return Response(status=status.HTTP_400_BAD_REQUEST)
 
-        if event["type"] == "checkout.session.completed":
-            session = event["data"]["object"]
-
-            amount_paid_cents = session["amount_total"]
-            email = session.get("customer_details", {}).get("email")
-            metadata = session.get("metadata", {})
-            user_id = metadata.get("user_id")
-            try:
-                user = User.objects.get(id=user_id)
-            except User.DoesNotExist as e:
-                logger.warning(f"User not found: {e}")
-                return Response(status=status.HTTP_404_NOT_FOUND)
-            with transaction.atomic():
-                transaction_amount = (Decimal(amount_paid_cents) / Decimal("100"))
-                transaction_amount = transaction_amount.quantize(Decimal("0.01"),
-                                                                 rounding=ROUND_DOWN)
-                user.balance = user.balance + transaction_amount
-                user.save()
-                Transaction.objects.create(
-                    user=user,
-                    amount=transaction_amount,
-                    email=email,
-                    status="SUCCESS",
-                )
-
-        elif event["type"] == "checkout.session.async_payment_failed":
-            session = event["data"]["object"]
-            email = session.get("customer_details", {}).get("email")
-            metadata = session.get("metadata", {})
-            user_id = metadata.get("user_id")
-
-            try:
-                amount_requested_cents = int(metadata.get("amount", "0"))
-            except (ValueError, TypeError):
-                amount_requested_cents = 0
-
-            try:
-                user = User.objects.get(id=user_id)
-            except User.DoesNotExist as e:
-                logger.warning(f"User not found: {e}")
-                return Response(status=status.HTTP_404_NOT_FOUND)
-
-            with (transaction.atomic()):
-                transaction_amount = (Decimal(amount_requested_cents) / Decimal("100"))
-                transaction_amount = transaction_amount.quantize(Decimal("0.01"),
-                                                                 rounding=ROUND_DOWN)
-                Transaction.objects.create(
-                    user=user,
-                    amount=transaction_amount,
-                    email=email,
-                    status="FAILED",
-                )
+        if event["type"] not in self.handlers:
+            return Response(status=status.HTTP_200_OK)
 
+        session = event["data"]["object"]
+        email = session.get("customer_details", {}).get("email")
+        metadata = session.get("metadata", {})
+        user_id = metadata.get("user_id")
+        try:
+            if event["type"] == "checkout.session.completed":
+                amount_cents = session["amount_total"]
+            else:
+                amount_cents = int(metadata.get("amount", "0"))
+        except (ValueError, TypeError):
+            amount_cents = 0
+        transaction_amount = (Decimal(amount_cents) / Decimal("100")).quantize(
+            Decimal("0.01"), rounding=ROUND_DOWN
+        )
+
+        try:
+            processed = self.handlers[event["type"]](
+                event["id"], event["type"], user_id, transaction_amount, email
+            )
+        except User.DoesNotExist as e:
+            logger.warning(f"User not found: {user_id} {e}")
+            return Response(status=status.HTTP_404_NOT_FOUND)
+        if not processed:
+            logger.info(f"Stripe event already processed: {event['id']}")
         return Response(status=status.HTTP_200_OK)
 
 
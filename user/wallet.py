@@ -0,0 +1,155 @@
+import uuid
+from decimal import Decimal
+
+from django.db import connection, transaction
+from django.utils.timezone import now
+
+from user.models import StripeEvent, Transaction, User
+
+
+class InsufficientFunds(Exception):
+    def __init__(self, balance: Decimal, amount: Decimal):
+        super().__init__(f"Balance {balance} is lower than {amount}")
+        self.balance = balance
+        self.amount = amount
+
+
+def _user_pk(user_id) -> uuid.UUID:
+    try:
+        return uuid.UUID(str(user_id))
+    except ValueError:
+        raise User.DoesNotExist
+
+
+def _execute(sql: str, params: list) -> list:
+    tables = {
+        name: connection.ops.quote_name(model._meta.db_table)
+        for name, model in (
+            ("table", User),
+            ("transactions", Transaction),
+            ("events", StripeEvent),
+        )
+    }
+    with connection.cursor() as cursor:
+        cursor.execute(sql.format(**tables), params)
+        return cursor.fetchall()
+
+
+def _update_balance(sql: str, params: list):
+    rows = _execute(sql, params)
+    return rows[0][0] if rows else None
+
+
+def debit(user_id, amount: Decimal) -> Decimal:
+    """
+    Subtract amount from the balance in a single conditional UPDATE and return
+    the new balance. Raises InsufficientFunds if the balance is lower than amount.
+    """
+    balance = _update_balance(
+        "UPDATE {table} SET balance = balance - %s "
+        "WHERE id = %s AND balance >= %s RETURNING balance",
+        [amount, _user_pk(user_id), amount],
+    )
+    if balance is None:
+        current = User.objects.filter(pk=user_id).values_list("balance", flat=True).first()
+        if current is None:
+            raise User.DoesNotExist
+        raise InsufficientFunds(current, amount)
+    return balance
+
+
+def credit(user_id, amount: Decimal) -> Decimal:
+    """Add amount to the balance and return the new balance."""
+    balance = _update_balance(
+        "UPDATE {table} SET balance = balance + %s WHERE id = %s RETURNING balance",
+        [amount, _user_pk(user_id)],
+    )
+    if balance is None:
+        raise User.DoesNotExist
+    return balance
+
+
+def credit_many(amounts: dict) -> dict:
+    """
+    Add {user_id: amount} to many balances in one UPDATE and return the new
+    balances by user id. Zero amounts are skipped.
+    """
+    amounts = {_user_pk(user_id): amount for user_id, amount in amounts.items() if amount}
+    if not amounts:
+        return {}
+    values = ", ".join(["(%s::uuid, %s::numeric)"] * len(amounts))
+    rows = _execute(
+        "UPDATE {table} AS wallet SET balance = wallet.balance + refund.amount "
+        f"FROM (VALUES {values}) AS refund (id, amount) "
+        "WHERE wallet.id = refund.id RETURNING wallet.id, wallet.balance",
+        [value for item in sorted(amounts.items()) for value in item],
+    )
+    return dict(rows)
+
+
+def _record_event(
+    event_id: str,
+    event_type: str,
+    wallet_sql: str,
+    wallet_params: list,
+    amount: Decimal,
+    email: str,
+    status: str,
+) -> bool:
+    """
+    Claim the event in the ledger and insert the transaction for the user
+    matched by wallet_sql, in one statement. Returns False, writing nothing,
+    for an already processed event; the claim is rolled back if the user is missing.
+    """
+    moment = now()
+    with transaction.atomic():
+        rows = _execute(
+            "WITH event AS ("
+            "INSERT INTO {events} (id, type, processed_at) VALUES (%s, %s, %s) "
+            "ON CONFLICT (id) DO NOTHING RETURNING id"
+            f"), wallet AS ({wallet_sql}), payment AS ("
+            "INSERT INTO {transactions} (id, amount, date, user_id, email, status) "
+            "SELECT %s, %s, %s, wallet.id, %s, %s FROM wallet"
+            ") SELECT EXISTS (SELECT FROM event), (SELECT balance FROM wallet)",
+            [event_id, event_type, moment, *wallet_params,
+             uuid.uuid4(), amount, moment, email, status],
+        )
+        claimed, balance = rows[0]
+        if claimed and balance is None:
+            raise User.DoesNotExist
+    return claimed
+
+
+def deposit(event_id: str, event_type: str, user_id, amount: Decimal, email: str) -> bool:
+    """
+    Credit a paid deposit and record its transaction once per event, as one
+    conditional statement. Returns False if the event was already processed.
+    """
+    return _record_event(
+        event_id,
+        event_type,
+        "UPDATE {table} SET balance = balance + %s "
+        "WHERE id = %s AND EXISTS (SELECT FROM event) RETURNING id, balance",
+        [amount, _user_pk(user_id)],
+        amount,
+        email,
+        "SUCCESS",
+    )
+
+
+def record_failed_deposit(
+    event_id: str, event_type: str, user_id, amount: Decimal, email: str
+) -> bool:
+    """
+    Record a failed deposit once per event without touching the balance.
+    Returns False if the event was already processed.
+    """
+    return _record_event(
+        event_id,
+        event_type,
+        "SELECT id, balance FROM {table} WHERE id = %s AND EXISTS (SELECT FROM event)",
+        [_user_pk(user_id)],
+        amount,
+        email,
+        "FAILED",
+    )